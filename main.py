@@ -5,6 +5,7 @@ import os
 from aiohttp import web
 
 from src.database import init_db, async_session
+from src.event_loop import new_event_loop
 from src.bot.registry import StudioBotRegistry, load_active_studios
 from src.bot.webhook_app import build_webhook_app, REGISTRY_KEY
 from src.bot.lifecycle import startup, shutdown
@@ -65,7 +66,12 @@ def main():
     app = build_webhook_app(registry)
     app.on_startup.append(_on_startup)
     app.on_shutdown.append(_on_shutdown)
-    web.run_app(app, host="0.0.0.0", port=int(os.environ.get("WEBHOOK_PORT", "8081")))
+    web.run_app(
+        app,
+        host="0.0.0.0",
+        port=int(os.environ.get("WEBHOOK_PORT", "8081")),
+        loop=new_event_loop(),
+    )
 
 
 if __name__ == "__main__":
@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 """Скрипт для массовой загрузки фотографий на Яндекс.Диск."""
-import asyncio
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.config import settings
+from src import event_loop
 from src.database import init_db, async_session
 from src.services.order_service import OrderService
 from src.services.file_service import FileService
@@ -68,5 +68,5 @@ async def backup_completed_orders():
 
 
 if __name__ == "__main__":
-    asyncio.run(backup_completed_orders())
+    event_loop.run(backup_completed_orders())
 
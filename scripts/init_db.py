@@ -10,8 +10,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.database import init_db, async_session
 from src.services.order_service import OrderService
-from src.services.settings_service import SettingsService, DEFAULT_SETTINGS, SettingType
+from src.services.settings_service import SettingsService
 from src.models.product import Product
+from src.models.studio import Studio
 from sqlalchemy import select
 
 
@@ -236,26 +237,15 @@ async def main():
     await init_db()
     print("✅ Таблицы созданы!")
     
-    # Создаём настройки по умолчанию
+    # Досеваем настройки по умолчанию: новые ключи из релиза появляются
+    # у существующих студий, заданные значения не трогаются
     print("\n⚙️ Создание настроек по умолчанию...")
     async with async_session() as session:
         settings_service = SettingsService(session)
-        
-        for setting_data in DEFAULT_SETTINGS:
-            existing = await settings_service.get_by_key(setting_data["key"])
-            if not existing:
-                await settings_service.create_setting(
-                    key=setting_data["key"],
-                    value=setting_data["value"],
-                    value_type=setting_data["value_type"],
-                    display_name=setting_data["display_name"],
-                    description=setting_data.get("description", ""),
-                    group=setting_data.get("group", "general"),
-                    sort_order=setting_data.get("sort_order", 0),
-                )
-                print(f"  ✅ {setting_data['display_name']}")
-            else:
-                print(f"  ⏭️ {setting_data['display_name']} (уже существует)")
+        studios = (await session.execute(select(Studio))).scalars().all()
+        for studio in studios:
+            added = await settings_service.seed_defaults(studio.id)
+            print(f"  ✅ {studio.slug}: добавлено настроек — {added}")
     
     # Создаём товары
     async with async_session() as session:
@@ -1,14 +1,13 @@
 """Студия-скоупленный контекст для хендлеров бота."""
 from dataclasses import dataclass
-from typing import Any, List, Optional
+from typing import Any, Optional, Sequence
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models.studio import Studio
-from src.models.product import Product
 from src.services.order_service import OrderService
 from src.services.settings_service import SettingsService
-from src.services.product_service import ProductService
+from src.services.product_service import ProductService, ProductView
 
 
 class SettingsFacade:
@@ -34,16 +33,16 @@ class ProductsFacade:
     def __init__(self, studio_id: int):
         self.studio_id = studio_id
 
-    def get(self, product_id: int) -> Optional[Product]:
+    def get(self, product_id: int) -> Optional[ProductView]:
         return ProductService.get_product(self.studio_id, product_id)
 
-    def top_level(self) -> List[Product]:
+    def top_level(self) -> Sequence[ProductView]:
         return ProductService.get_top_level_products(self.studio_id)
 
-    def children(self, parent_id: int) -> List[Product]:
+    def children(self, parent_id: int) -> Sequence[ProductView]:
         return ProductService.get_active_children(self.studio_id, parent_id)
 
-    def all_purchasable(self) -> List[Product]:
+    def all_purchasable(self) -> Sequence[ProductView]:
         return ProductService.get_all_purchasable(self.studio_id)
 
 
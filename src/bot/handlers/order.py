@@ -28,6 +28,9 @@ logger = logging.getLogger(__name__)
 _media_groups: Dict[str, dict] = {}
 _single_photo_tasks: Dict[int, dict] = {}
 
+# Сколько фото заказа одновременно качается из Telegram для умного кропа
+CROP_DOWNLOAD_CONCURRENCY = 4
+
 UPLOAD_MESSAGE = """📸 Пожалуйста, ознакомьтесь с тем, как будут кадрироваться фото:
 https://dariakis28.ru/kadrirovanie-fotografiy
 
@@ -60,41 +63,42 @@ async def analyze_photos_for_crop(
 
     crop_service = get_smart_crop_service(face_priority)
 
-    auto_approved = 0
-    needs_review = 0
+    # Не больше N скачиваний из Telegram одновременно
+    semaphore = asyncio.Semaphore(CROP_DOWNLOAD_CONCURRENCY)
 
-    for photo in photos:
+    async def analyze(photo) -> bool:
+        """Анализирует одно фото; True — автоодобрено, False — на проверку."""
         if photo.auto_crop_data:
-            if photo.crop_confidence and photo.crop_confidence >= confidence_threshold:
-                auto_approved += 1
-            else:
-                needs_review += 1
-            continue
+            return bool(photo.crop_confidence and photo.crop_confidence >= confidence_threshold)
 
         try:
-            file = await bot.get_file(photo.telegram_file_id)
-            photo_bytes = await bot.download_file(file.file_path)
+            async with semaphore:
+                file = await bot.get_file(photo.telegram_file_id)
+                photo_bytes = await bot.download_file(file.file_path)
             image_data = photo_bytes.read()
 
             # Получаем aspect_ratio из продукта
             product = ctx.products.get(photo.product_id)
             aspect_ratio = product.aspect_ratio if product and product.aspect_ratio else 0.76
 
-            result = crop_service.analyze_photo(image_data, aspect_ratio=aspect_ratio)
+            result = await crop_service.analyze_photo_async(image_data, aspect_ratio=aspect_ratio)
 
             photo.auto_crop_data = result.to_json()
             photo.crop_confidence = result.confidence
             photo.crop_method = result.method
             photo.faces_found = result.faces_found
 
-            if result.confidence >= confidence_threshold:
-                auto_approved += 1
-            else:
-                needs_review += 1
+            return result.confidence >= confidence_threshold
 
         except Exception as e:
             logger.error(f"Ошибка анализа фото {photo.id}: {e}")
-            needs_review += 1
+            return False
+
+    # Скачивание и анализ фото идут параллельно: пока одно качается,
+    # другие уже считаются в пуле потоков кропа
+    approved = await asyncio.gather(*(analyze(photo) for photo in photos))
+    auto_approved = sum(approved)
+    needs_review = len(approved) - auto_approved
 
     await session.commit()
 
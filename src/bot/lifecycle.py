@@ -43,7 +43,10 @@ async def unregister_studio(registry: StudioBotRegistry, studio_id: int) -> None
 async def startup(registry: StudioBotRegistry, session) -> None:
     studios = await load_active_studios(session)
     for s in studios:
-        await SettingsService(session).load_cache(s.id)
+        # Свежий снимок на диске избавляет от чтения настроек из БД;
+        # недостающие настройки досевает scripts/init_db.py, а не старт бота
+        if not SettingsService.load_persisted_cache(s.id):
+            await SettingsService(session).load_cache(s.id, persist=True)
         await ProductService(session).load_cache(s.id)
         await register_studio(registry, s)
 
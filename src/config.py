@@ -24,6 +24,11 @@ class Settings(BaseSettings):
 
     # Yandex Disk
     yandex_disk_token: str = Field(default="", alias="YANDEX_DISK_TOKEN")
+    # Сколько файлов заказа грузится на Я.Диск одновременно
+    yandex_upload_concurrency: int = Field(default=8, alias="YANDEX_UPLOAD_CONCURRENCY")
+    # Сколько секунд помнить созданные папки на диске между перезапусками (0 — выключено);
+    # файл лежит в SETTINGS_SNAPSHOT_DIR
+    yandex_folder_cache_ttl: int = Field(default=0, alias="YANDEX_FOLDER_CACHE_TTL")
 
     # Admin Panel
     admin_secret_key: str = Field(default="change_me_in_production", alias="ADMIN_SECRET_KEY")
@@ -35,6 +40,17 @@ class Settings(BaseSettings):
     photos_dir: Path = Field(default=Path("./storage/photos"), alias="PHOTOS_DIR")
     temp_dir: Path = Field(default=Path("./storage/temp"), alias="TEMP_DIR")
 
+    # Снимок кеша настроек на диске для быстрого старта бота; 0 — выключено.
+    # Снимок старше TTL игнорируется и настройки читаются из БД
+    cache_snapshot_dir: Path = Field(default=Path("./storage/cache"), alias="SETTINGS_SNAPSHOT_DIR")
+    cache_snapshot_ttl: int = Field(default=0, alias="SETTINGS_SNAPSHOT_TTL")
+
+    # Smart crop: ONNX-модель YuNet; если файла нет — каскад Хаара из OpenCV
+    face_detector_model: Path = Field(
+        default=Path("./storage/models/face_detection_yunet_2023mar.onnx"),
+        alias="FACE_DETECTOR_MODEL",
+    )
+
     # Manager contact (значение берётся из .env или записи Studio; дефолт пустой)
     manager_username: str = Field(default="", alias="MANAGER_USERNAME")
 
@@ -0,0 +1,29 @@
+"""Цикл событий для точек входа: uvloop, если он установлен.
+
+uvloop приезжает с uvicorn[standard]; на хостах без него (Windows)
+используется стандартный asyncio. Политику цикла не подменяем —
+uvloop.install() устарел начиная с Python 3.12.
+"""
+import asyncio
+from typing import Any, Coroutine, TypeVar
+
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - зависит от платформы
+    uvloop = None
+
+T = TypeVar("T")
+
+
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """Новый цикл событий: uvloop или стандартный."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def run(main: Coroutine[Any, Any, T]) -> T:
+    """asyncio.run на цикле из new_event_loop."""
+    if uvloop is not None:
+        return uvloop.run(main)
+    return asyncio.run(main)
@@ -1,6 +1,8 @@
 """Базовая модель SQLAlchemy."""
 from datetime import datetime
 from sqlalchemy import DateTime, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -19,3 +21,9 @@ class Base(DeclarativeBase):
         nullable=False
     )
 
+
+def dialect_insert(session: AsyncSession, entity):
+    """INSERT под диалект сессии — с поддержкой ON CONFLICT (PostgreSQL / SQLite)."""
+    if session.bind.dialect.name == "sqlite":
+        return sqlite.insert(entity)
+    return postgresql.insert(entity)
@@ -45,7 +45,7 @@ class Photo(Base):
     # Уверенность авто-кропа (0-1)
     crop_confidence: Mapped[Optional[float]] = mapped_column(nullable=True)
     
-    # Метод авто-кропа: "face", "saliency", "center"
+    # Метод авто-кропа: "face", "saliency", "center", "identity"
     crop_method: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     
     # Количество найденных лиц
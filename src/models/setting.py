@@ -6,6 +6,14 @@ from sqlalchemy.orm import Mapped, mapped_column
 
 from src.models.base import Base
 
+# Строковые значения, которые считаются «истиной» для булевых настроек
+TRUE_STRINGS = frozenset({"true", "1", "yes", "да", "on", "y"})
+
+
+def is_true_string(value: str) -> bool:
+    """Строка-«истина»; нормализуем регистр и пробелы только при промахе."""
+    return value in TRUE_STRINGS or value.strip().lower() in TRUE_STRINGS
+
 
 class SettingType(str, Enum):
     """Типы настроек."""
@@ -52,15 +60,21 @@ class Setting(Base):
     
     def get_typed_value(self):
         """Возвращает значение с правильным типом."""
-        if self.value_type == SettingType.INTEGER:
-            return int(self.value) if self.value else 0
-        elif self.value_type == SettingType.FLOAT:
-            return float(self.value) if self.value else 0.0
-        elif self.value_type == SettingType.BOOLEAN:
-            return self.value.lower() in ("true", "1", "yes", "да")
-        else:
-            return self.value
+        return parse_setting_value(self.value, self.value_type)
     
     def __repr__(self) -> str:
         return f"<Setting {self.key}={self.value}>"
 
+
+# Разбор строкового значения по типу; STRING и прочие возвращаются как есть
+_TYPE_PARSERS = {
+    SettingType.INTEGER: lambda v: int(v) if v else 0,
+    SettingType.FLOAT: lambda v: float(v) if v else 0.0,
+    SettingType.BOOLEAN: is_true_string,
+}
+
+
+def parse_setting_value(value: str, value_type: SettingType):
+    """Приводит сырое значение настройки к её типу."""
+    parser = _TYPE_PARSERS.get(value_type)
+    return parser(value) if parser else value
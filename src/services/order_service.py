@@ -6,7 +6,9 @@ from typing import Optional, List
 from sqlalchemy import select, update, func, or_, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from src.models.base import dialect_insert
 from src.models.user import User
 from src.models.order import Order, OrderStatus, DeliveryType
 from src.models.photo import Photo
@@ -37,31 +39,32 @@ class OrderService:
         first_name: Optional[str] = None,
         last_name: Optional[str] = None,
     ) -> User:
-        """Получает или создаёт пользователя в рамках текущей студии."""
-        query = select(User).where(
-            User.studio_id == self.studio_id,
-            User.telegram_id == telegram_id,
-        )
-        result = await self.session.execute(query)
-        user = result.scalar_one_or_none()
-
-        if user:
-            user.username = username
-            user.first_name = first_name
-            user.last_name = last_name
-            await self.session.commit()
-            return user
+        """Получает или создаёт пользователя в рамках текущей студии.
 
-        user = User(
+        Один UPSERT по (studio_id, telegram_id): без гонки между SELECT и INSERT,
+        профиль существующего пользователя обновляется тем же запросом.
+        """
+        stmt = dialect_insert(self.session, User).values(
             studio_id=self.studio_id,
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
             last_name=last_name,
         )
-        self.session.add(user)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.studio_id, User.telegram_id],
+            set_={
+                "username": stmt.excluded.username,
+                "first_name": stmt.excluded.first_name,
+                "last_name": stmt.excluded.last_name,
+                "updated_at": func.now(),
+            },
+        ).returning(User)
+        result = await self.session.execute(
+            stmt, execution_options={"populate_existing": True}
+        )
+        user = result.scalar_one()
         await self.session.commit()
-        await self.session.refresh(user)
         return user
     
     # === Работа с заказами ===
@@ -159,42 +162,38 @@ class OrderService:
         offset: int = 0,
     ) -> tuple[List[Order], int]:
         """Поиск и фильтрация заказов с пагинацией."""
-        base_query = select(Order).where(
-            Order.studio_id == self.studio_id, Order.status != OrderStatus.DRAFT
-        )
-        count_query = select(func.count(Order.id)).where(
-            Order.studio_id == self.studio_id, Order.status != OrderStatus.DRAFT
-        )
+        # Фильтры собираются один раз и общие для выборки и подсчёта: структура
+        # запроса зависит только от набора фильтров, значения идут bind-параметрами,
+        # поэтому скомпилированный SQL переиспользуется из кеша движка.
+        filters = [Order.studio_id == self.studio_id, Order.status != OrderStatus.DRAFT]
         
         if status:
-            base_query = base_query.where(Order.status == status)
-            count_query = count_query.where(Order.status == status)
+            filters.append(Order.status == status)
         
         if date_from:
-            base_query = base_query.where(Order.created_at >= date_from)
-            count_query = count_query.where(Order.created_at >= date_from)
+            filters.append(Order.created_at >= date_from)
         
         if date_to:
             date_to_end = date_to.replace(hour=23, minute=59, second=59)
-            base_query = base_query.where(Order.created_at <= date_to_end)
-            count_query = count_query.where(Order.created_at <= date_to_end)
+            filters.append(Order.created_at <= date_to_end)
+        
+        base_query = select(Order)
+        count_query = select(func.count(Order.id))
         
         if search:
             search_term = f"%{search}%"
-            base_query = base_query.join(User, Order.user_id == User.id).where(
-                or_(
-                    Order.order_number.ilike(search_term),
-                    User.username.ilike(search_term),
-                    User.first_name.ilike(search_term),
-                )
-            )
-            count_query = count_query.join(User, Order.user_id == User.id).where(
+            filters.append(
                 or_(
                     Order.order_number.ilike(search_term),
                     User.username.ilike(search_term),
                     User.first_name.ilike(search_term),
                 )
             )
+            base_query = base_query.join(User, Order.user_id == User.id)
+            count_query = count_query.join(User, Order.user_id == User.id)
+        
+        base_query = base_query.where(*filters)
+        count_query = count_query.where(*filters)
         
         total_result = await self.session.execute(count_query)
         total_count = total_result.scalar() or 0
@@ -377,15 +376,26 @@ class OrderService:
         return result.scalar_one_or_none()
     
     async def apply_promocode(self, order: Order, promocode: Promocode) -> Order:
-        """Применяет промокод к заказу."""
+        """Применяет промокод к заказу.
+
+        Счётчик использований увеличивается атомарно на стороне БД
+        (current_uses = current_uses + 1), без read-modify-write в Python —
+        параллельные применения не теряют инкременты.
+        """
         discount = promocode.calculate_discount(order.photos_cost)
+        result = await self.session.execute(
+            update(Promocode)
+            .where(Promocode.studio_id == self.studio_id, Promocode.id == promocode.id)
+            .values(current_uses=Promocode.current_uses + 1)
+            .returning(Promocode.current_uses)
+            .execution_options(synchronize_session=False)
+        )
+        set_committed_value(promocode, "current_uses", result.scalar_one())
+
         order.promocode_id = promocode.id
         order.discount = discount
         
-        promocode.current_uses += 1
-        
         await self.session.commit()
-        await self.session.refresh(order)
         return order
     
     async def create_promocode(
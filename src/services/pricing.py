@@ -1,15 +1,14 @@
 """Сервис расчёта стоимости (studio-скоупленный)."""
 from typing import Dict, List, Optional
 
-from src.models.product import Product
+from src.services.product_service import ProductService, ProductView
 
 
 class PricingService:
     """Расчёт стоимости заказа на каталоге конкретной студии."""
 
     @classmethod
-    def get_product(cls, studio_id: int, product_id: int) -> Optional[Product]:
-        from src.services.product_service import ProductService
+    def get_product(cls, studio_id: int, product_id: int) -> Optional[ProductView]:
         return ProductService.get_product(studio_id, product_id)
 
     @classmethod
@@ -45,7 +44,7 @@ class PricingService:
         return total
 
     @classmethod
-    def _calculate_tiered_cost(cls, product: Product, count: int) -> int:
+    def _calculate_tiered_cost(cls, product: ProductView, count: int) -> int:
         if count <= 0:
             return 0
         tiers = product.get_price_tiers()
@@ -86,7 +85,7 @@ class PricingService:
     @classmethod
     def get_price_optimization_hint(cls, studio_id: int, photos_by_product: Dict[int, int]) -> Optional[str]:
         group_totals: Dict[str, int] = {}
-        group_example: Dict[str, Product] = {}
+        group_example: Dict[str, ProductView] = {}
         for product_id, count in photos_by_product.items():
             product = cls.get_product(studio_id, product_id)
             if not product:
@@ -1,23 +1,102 @@
 """Сервис управления товарами/форматами (пер-студийный кеш)."""
 import logging
-from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from src.models.product import Product
 
 logger = logging.getLogger(__name__)
 
 
-class ProductService:
-    """Кеш товаров на уровне класса, ключённый по studio_id."""
+@dataclass(slots=True, frozen=True)
+class ProductView:
+    """Неизменяемый снимок товара для кеша: только поля, нужные боту и расчёту цен.
+
+    Не держит InstanceState и сессию — живёт в кеше сколько угодно.
+    """
+
+    id: int
+    parent_id: Optional[int]
+    slug: str
+    name: str
+    short_name: str
+    emoji: str
+    description: Optional[str]
+    price_per_unit: int
+    price_type: str
+    pricing_group: Optional[str]
+    aspect_ratio: Optional[float]
+    is_active: bool
+    sort_order: int
+    # Тиры, разобранные из JSON один раз при загрузке
+    tiers: Tuple[Dict[str, Any], ...] = ()
+
+    @classmethod
+    def from_product(cls, p: Product) -> "ProductView":
+        return cls(
+            id=p.id,
+            parent_id=p.parent_id,
+            slug=p.slug,
+            name=p.name,
+            short_name=p.short_name,
+            emoji=p.emoji,
+            description=p.description,
+            price_per_unit=p.price_per_unit,
+            price_type=p.price_type,
+            pricing_group=p.pricing_group,
+            aspect_ratio=p.aspect_ratio,
+            is_active=p.is_active,
+            sort_order=p.sort_order,
+            tiers=tuple(p.get_price_tiers()),
+        )
+
+    @property
+    def display_price(self) -> str:
+        """Цена для отображения."""
+        if self.price_type == "fixed":
+            return f"{self.price_per_unit}₽"
+        elif self.price_type == "tiered":
+            return f"от {self.price_per_unit}₽/шт"
+        else:
+            return f"{self.price_per_unit}₽/шт"
+
+    def get_price_tiers(self) -> list:
+        """Возвращает тиры как список словарей."""
+        return list(self.tiers)
+
 
-    # {studio_id: {product_id: Product}}
-    _products: Dict[int, Dict[int, Product]] = {}
-    # {studio_id: [Product, ...]} — верхний уровень
-    _top_level: Dict[int, List[Product]] = {}
+@dataclass(slots=True, frozen=True)
+class _StudioCatalog:
+    """Закешированный каталог одной студии и производные от него выборки.
+
+    Снимок неизменяем: запись собирает новый каталог и одним присваиванием
+    подменяет его в _catalogs, так что читатель никогда не видит
+    полуобновлённое состояние.
+    """
+
+    # {product_id: ProductView}
+    products: Dict[int, ProductView]
+    # Активные товары верхнего уровня
+    top_level_active: Tuple[ProductView, ...] = ()
+    # {parent_id: (ProductView, ...)} — активные варианты по родителю
+    active_children: Dict[int, Tuple[ProductView, ...]] = field(default_factory=dict)
+    # Всё, что можно положить в заказ
+    all_purchasable: Tuple[ProductView, ...] = ()
+    # Растёт на каждую подмену снимка студии
+    version: int = 1
+
+
+# {studio_id: _StudioCatalog} — студия есть в словаре, только если кеш загружен
+_catalogs: Dict[int, _StudioCatalog] = {}
+
+
+class ProductService:
+    """Кеш товаров на уровне модуля, ключённый по studio_id."""
 
     def __init__(self, session: AsyncSession):
         self.session = session
@@ -26,56 +105,165 @@ class ProductService:
         query = (
             select(Product)
             .where(Product.studio_id == studio_id)
-            .options(selectinload(Product.children), selectinload(Product.parent))
             .order_by(Product.sort_order)
         )
         result = await self.session.execute(query)
-        products = result.scalars().unique().all()
-        ProductService._products[studio_id] = {p.id: p for p in products}
-        ProductService._top_level[studio_id] = [
-            p for p in products if p.parent_id is None and p.is_active
-        ]
+        # В кеш идут только снимки; ORM-объекты остаются в CRUD админки.
+        # Один проход по выборке. Запрос уже отсортирован по sort_order —
+        # порядок вставки сохраняет его, пересортировка не нужна.
+        products = [ProductView.from_product(p) for p in result.scalars().all()]
+        products_by_id: Dict[int, ProductView] = {}
+        top_active: List[ProductView] = []
+        children_map: Dict[int, List[ProductView]] = {}
+        for p in products:
+            products_by_id[p.id] = p
+            if p.parent_id is None:
+                if p.is_active:
+                    top_active.append(p)
+            elif p.is_active:
+                children_map.setdefault(p.parent_id, []).append(p)
+        top_level_active = tuple(top_active)
+        active_children = {
+            parent_id: tuple(children) for parent_id, children in children_map.items()
+        }
+        previous = _catalogs.get(studio_id)
+        _catalogs[studio_id] = _StudioCatalog(
+            products=products_by_id,
+            top_level_active=top_level_active,
+            active_children=active_children,
+            all_purchasable=ProductService._build_purchasable(
+                top_level_active, active_children
+            ),
+            version=previous.version + 1 if previous else 1,
+        )
         logger.info(f"Студия {studio_id}: загружено {len(products)} товаров")
 
-    @classmethod
-    def get_product(cls, studio_id: int, product_id: int) -> Optional[Product]:
-        return cls._products.get(studio_id, {}).get(product_id)
+    @staticmethod
+    def _link_parents(products: List[Product]) -> None:
+        """Проставляет Product.parent из той же выборки вместо отдельного SELECT.
 
-    @classmethod
-    def get_top_level_products(cls, studio_id: int) -> List[Product]:
-        return [p for p in cls._top_level.get(studio_id, []) if p.is_active]
+        Все родители студии уже есть в результате запроса; set_committed_value
+        не помечает объекты изменёнными.
+        """
+        by_id = {p.id: p for p in products}
+        for p in products:
+            set_committed_value(p, "parent", by_id.get(p.parent_id) if p.parent_id else None)
 
-    @classmethod
-    def get_active_children(cls, studio_id: int, parent_id: int) -> List[Product]:
-        parent = cls._products.get(studio_id, {}).get(parent_id)
-        if not parent:
-            return []
-        return sorted(
-            [c for c in parent.children if c.is_active],
-            key=lambda x: x.sort_order,
-        )
+    @staticmethod
+    def get_product(studio_id: int, product_id: int) -> Optional[ProductView]:
+        catalog = _catalogs.get(studio_id)
+        return catalog.products.get(product_id) if catalog else None
 
-    @classmethod
-    def get_all_purchasable(cls, studio_id: int) -> List[Product]:
-        result = []
-        for p in cls._top_level.get(studio_id, []):
-            if not p.is_active:
-                continue
-            children = [c for c in p.children if c.is_active]
+    @staticmethod
+    def get_top_level_products(studio_id: int) -> Tuple[ProductView, ...]:
+        catalog = _catalogs.get(studio_id)
+        return catalog.top_level_active if catalog else ()
+
+    @staticmethod
+    def get_active_children(studio_id: int, parent_id: int) -> Tuple[ProductView, ...]:
+        catalog = _catalogs.get(studio_id)
+        return catalog.active_children.get(parent_id, ()) if catalog else ()
+
+    @staticmethod
+    def get_all_purchasable(studio_id: int) -> Tuple[ProductView, ...]:
+        catalog = _catalogs.get(studio_id)
+        return catalog.all_purchasable if catalog else ()
+
+    @staticmethod
+    def get_catalog_version(studio_id: int) -> int:
+        """Версия текущего снимка каталога студии (0 — кеш не загружен)."""
+        catalog = _catalogs.get(studio_id)
+        return catalog.version if catalog else 0
+
+    @staticmethod
+    def _build_purchasable(
+        top_level_active: Tuple[ProductView, ...],
+        active_children: Dict[int, Tuple[ProductView, ...]],
+    ) -> Tuple[ProductView, ...]:
+        """Варианты категорий вместо самих категорий, самостоятельные товары — как есть."""
+        result: List[ProductView] = []
+        for p in top_level_active:
+            children = active_children.get(p.id)
             if children:
                 result.extend(children)
             else:
                 result.append(p)
-        return result
+        return tuple(result)
+
+    @staticmethod
+    def _collect_group(
+        products: Dict[int, ProductView], parent_id: Optional[int]
+    ) -> Tuple[ProductView, ...]:
+        """Активный список одного уровня: верхний (None) или варианты родителя."""
+        return tuple(sorted(
+            (p for p in products.values()
+             if p.parent_id == parent_id and p.is_active),
+            key=lambda p: p.sort_order,
+        ))
 
     @classmethod
-    def invalidate_cache(cls, studio_id: Optional[int] = None):
+    def _apply_delta(
+        cls,
+        studio_id: int,
+        product: Product,
+        op: str,
+        previous_parent_id: Optional[int] = None,
+    ) -> None:
+        """Применяет запись к кешу студии: op = "upsert" | "delete".
+
+        Copy-on-write: новый снимок собирается из старого плюс дельта
+        (пересобираются только старый и новый родитель) и подменяется
+        целиком. Между чтением старого снимка и подменой нет await, так
+        что параллельные корутины не теряют записи друг друга.
+        """
+        old = _catalogs[studio_id]
+        products = dict(old.products)
+        active_children = dict(old.active_children)
+        top_level_active = old.top_level_active
+        affected = {product.parent_id, previous_parent_id}
+        if op == "delete":
+            products.pop(product.id, None)
+            # Варианты удаляются каскадом вместе с категорией
+            for child_id in [pid for pid, p in products.items() if p.parent_id == product.id]:
+                products.pop(child_id)
+            active_children.pop(product.id, None)
+        else:
+            products[product.id] = ProductView.from_product(product)
+        for parent_id in affected:
+            group = cls._collect_group(products, parent_id)
+            if parent_id is None:
+                top_level_active = group
+            elif group:
+                active_children[parent_id] = group
+            else:
+                active_children.pop(parent_id, None)
+        _catalogs[studio_id] = _StudioCatalog(
+            products=products,
+            top_level_active=top_level_active,
+            active_children=active_children,
+            all_purchasable=cls._build_purchasable(top_level_active, active_children),
+            version=old.version + 1,
+        )
+
+    async def _patch_cache(
+        self,
+        studio_id: int,
+        product: Product,
+        op: str,
+        previous_parent_id: Optional[int] = None,
+    ) -> None:
+        """Патчит прогретый кеш; холодный — загружает целиком."""
+        if studio_id in _catalogs:
+            ProductService._apply_delta(studio_id, product, op, previous_parent_id)
+        else:
+            await self.load_cache(studio_id)
+
+    @staticmethod
+    def invalidate_cache(studio_id: Optional[int] = None):
         if studio_id is None:
-            cls._products.clear()
-            cls._top_level.clear()
+            _catalogs.clear()
         else:
-            cls._products.pop(studio_id, None)
-            cls._top_level.pop(studio_id, None)
+            _catalogs.pop(studio_id, None)
 
     # === CRUD ===
 
@@ -83,39 +271,37 @@ class ProductService:
         query = (
             select(Product)
             .where(Product.studio_id == studio_id)
-            .options(selectinload(Product.children), selectinload(Product.parent))
+            .options(selectinload(Product.children), raiseload("*"))
             .order_by(Product.sort_order)
         )
         result = await self.session.execute(query)
-        return list(result.scalars().unique().all())
+        products = list(result.scalars().all())
+        self._link_parents(products)
+        return products
 
     async def get_product_by_id(self, product_id: int) -> Optional[Product]:
-        query = (
-            select(Product)
-            .where(Product.id == product_id)
-            .options(selectinload(Product.children))
+        # Session.get сначала смотрит identity map — без запроса, если товар уже в сессии
+        return await self.session.get(
+            Product, product_id, options=[selectinload(Product.children)]
         )
-        result = await self.session.execute(query)
-        return result.scalar_one_or_none()
 
     async def create_product(self, studio_id: int, **kwargs) -> Product:
         product = Product(studio_id=studio_id, **kwargs)
         self.session.add(product)
         await self.session.commit()
-        await self.session.refresh(product)
-        await self.load_cache(studio_id)
+        await self._patch_cache(studio_id, product, "upsert")
         return product
 
     async def update_product(self, product_id: int, studio_id: int, **kwargs) -> Optional[Product]:
         product = await self.get_product_by_id(product_id)
         if not product or product.studio_id != studio_id:
             return None
+        previous_parent_id = product.parent_id
         for key, value in kwargs.items():
             if hasattr(product, key):
                 setattr(product, key, value)
         await self.session.commit()
-        await self.session.refresh(product)
-        await self.load_cache(product.studio_id)
+        await self._patch_cache(studio_id, product, "upsert", previous_parent_id)
         return product
 
     async def delete_product(self, product_id: int, studio_id: int) -> bool:
@@ -124,7 +310,7 @@ class ProductService:
             return False
         await self.session.delete(product)
         await self.session.commit()
-        await self.load_cache(studio_id)
+        await self._patch_cache(studio_id, product, "delete")
         return True
 
     async def toggle_product(self, product_id: int, studio_id: int) -> Optional[Product]:
@@ -133,6 +319,5 @@ class ProductService:
             return None
         product.is_active = not product.is_active
         await self.session.commit()
-        await self.session.refresh(product)
-        await self.load_cache(product.studio_id)
+        await self._patch_cache(studio_id, product, "upsert")
         return product
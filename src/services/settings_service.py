@@ -1,64 +1,193 @@
 """Сервис настроек с кешированием."""
-from typing import Any, Dict, Optional
-from sqlalchemy import select
+import logging
+import os
+import pickle
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.models.setting import Setting, SettingType
+from src.config import settings as app_settings
+from src.models.base import dialect_insert
+from src.models.setting import (
+    Setting, SettingType, is_true_string, parse_setting_value,
+)
 
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True, frozen=True)
+class _StudioSettings:
+    """Настройки одной студии: сырые значения и заранее приведённые копии.
+
+    Опубликованный снимок не меняется: запись собирает новый и подменяет
+    его в _settings одним присваиванием.
+    """
+
+    # {key: typed_value}
+    values: Dict[str, Any] = field(default_factory=dict)
+    # Значения для get_int/get_float/get_bool; ключа нет, если привести нельзя
+    ints: Dict[str, int] = field(default_factory=dict)
+    floats: Dict[str, float] = field(default_factory=dict)
+    bools: Dict[str, bool] = field(default_factory=dict)
+    # Снимок собран load_cache из всех строк студии; частичный (только ключи,
+    # записанные в этом процессе) на диск не попадает
+    complete: bool = False
 
-class SettingsService:
-    """Сервис настроек с пер-студийным кешем в памяти."""
 
-    # Кеш: {studio_id: {key: typed_value}}
-    _cache: Dict[int, Dict[str, Any]] = {}
+# {studio_id: _StudioSettings} — студия есть в словаре, только если кеш загружен
+_settings: Dict[int, _StudioSettings] = {}
+# Общая пустая заглушка для незагруженной студии — промах без аллокации
+_EMPTY = _StudioSettings()
+
+
+class SettingsService:
+    """Кеш настроек на уровне модуля, ключённый по studio_id."""
 
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def load_cache(self, studio_id: int) -> None:
-        """Загружает настройки одной студии в кеш."""
-        query = select(Setting).where(Setting.studio_id == studio_id)
+    async def load_cache(self, studio_id: int, persist: bool = False) -> None:
+        """Загружает настройки одной студии в кеш.
+
+        persist=True — ещё и сохранить снимок на диск (старт бота); админка
+        перечитывает кеш на каждом просмотре и файл не трогает.
+        """
+        # Только нужные колонки: кешу не нужны ORM-объекты и identity map
+        query = select(Setting.key, Setting.value, Setting.value_type).where(
+            Setting.studio_id == studio_id
+        )
         result = await self.session.execute(query)
-        settings = result.scalars().all()
-        SettingsService._cache[studio_id] = {
-            s.key: s.get_typed_value() for s in settings
-        }
-
-    @classmethod
-    def get(cls, studio_id: int, key: str, default: Any = None) -> Any:
-        return cls._cache.get(studio_id, {}).get(key, default)
-
-    @classmethod
-    def get_int(cls, studio_id: int, key: str, default: int = 0) -> int:
-        value = cls.get(studio_id, key, default)
+        snapshot = _StudioSettings(complete=True)
+        for key, value, value_type in result.all():
+            SettingsService._store(snapshot, key, parse_setting_value(value, value_type))
+        _settings[studio_id] = snapshot
+        if persist:
+            SettingsService._persist(studio_id, snapshot)
+
+    @staticmethod
+    def _store(snapshot: _StudioSettings, key: str, value: Any) -> None:
+        """Кладёт значение в снимок и один раз приводит его к int/float/bool."""
+        # Ключи из БД — новые строки; интернированный ключ совпадает по
+        # указателю с литералами SettingKeys, и поиск в dict не сравнивает строки
+        key = sys.intern(key)
+        snapshot.values[key] = value
         try:
-            return int(value)
+            snapshot.ints[key] = int(value)
         except (ValueError, TypeError):
-            return default
-
-    @classmethod
-    def get_float(cls, studio_id: int, key: str, default: float = 0.0) -> float:
-        value = cls.get(studio_id, key, default)
+            snapshot.ints.pop(key, None)
         try:
-            return float(value)
+            snapshot.floats[key] = float(value)
         except (ValueError, TypeError):
-            return default
-
-    @classmethod
-    def get_bool(cls, studio_id: int, key: str, default: bool = False) -> bool:
-        value = cls.get(studio_id, key, default)
-        if isinstance(value, bool):
-            return value
+            snapshot.floats.pop(key, None)
         if isinstance(value, str):
-            return value.lower() in ("true", "1", "yes", "да")
-        return bool(value)
+            snapshot.bools[key] = is_true_string(value)
+        else:
+            snapshot.bools[key] = bool(value)
+
+    @staticmethod
+    def _store_for(studio_id: int, key: str, value: Any) -> None:
+        """Обновляет одно значение в кеше студии copy-on-write.
+
+        Читатели, в том числе потоки пула кропа, видят либо старый снимок,
+        либо новый целиком — без блокировок на чтении.
+        """
+        old = _settings.get(studio_id, _EMPTY)
+        snapshot = _StudioSettings(
+            values=dict(old.values),
+            ints=dict(old.ints),
+            floats=dict(old.floats),
+            bools=dict(old.bools),
+            complete=old.complete,
+        )
+        SettingsService._store(snapshot, key, value)
+        _settings[studio_id] = snapshot
+        if snapshot.complete:
+            SettingsService._persist(studio_id, snapshot)
+        else:
+            # Полного снимка в процессе нет — старый файл на диске устарел
+            SettingsService._drop_snapshot(studio_id)
+
+    # === Снимок на диске ===
+
+    @staticmethod
+    def _snapshot_path(studio_id: int) -> Path:
+        return app_settings.cache_snapshot_dir / f"settings_{studio_id}.pkl"
 
-    @classmethod
-    def invalidate_cache(cls, studio_id: Optional[int] = None) -> None:
+    @staticmethod
+    def _persist(studio_id: int, snapshot: _StudioSettings) -> None:
+        """Сохраняет снимок студии на диск (если снимки включены)."""
+        if app_settings.cache_snapshot_ttl <= 0:
+            return
+        path = SettingsService._snapshot_path(studio_id)
+        tmp = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(snapshot, f, protocol=5)
+            # Атомарная замена: читатель не увидит недописанный файл
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить снимок настроек студии {studio_id}: {e}")
+
+    @staticmethod
+    def _drop_snapshot(studio_id: int) -> None:
+        if app_settings.cache_snapshot_ttl > 0:
+            SettingsService._snapshot_path(studio_id).unlink(missing_ok=True)
+
+    @staticmethod
+    def load_persisted_cache(studio_id: int) -> bool:
+        """Поднимает кеш студии из свежего снимка на диске без запроса в БД.
+
+        Returns False, если снимки выключены, файла нет или он старше TTL.
+        """
+        ttl = app_settings.cache_snapshot_ttl
+        if ttl <= 0:
+            return False
+        path = SettingsService._snapshot_path(studio_id)
+        try:
+            if time.time() - path.stat().st_mtime > ttl:
+                return False
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, TypeError):
+            return False
+        if not isinstance(snapshot, _StudioSettings) or not snapshot.complete:
+            return False
+        _settings[studio_id] = snapshot
+        return True
+
+    # Горячий путь: staticmethod без привязки cls и один поиск по студии
+
+    @staticmethod
+    def get(studio_id: int, key: str, default: Any = None) -> Any:
+        return _settings.get(studio_id, _EMPTY).values.get(key, default)
+
+    @staticmethod
+    def get_int(studio_id: int, key: str, default: int = 0) -> int:
+        return _settings.get(studio_id, _EMPTY).ints.get(key, default)
+
+    @staticmethod
+    def get_float(studio_id: int, key: str, default: float = 0.0) -> float:
+        return _settings.get(studio_id, _EMPTY).floats.get(key, default)
+
+    @staticmethod
+    def get_bool(studio_id: int, key: str, default: bool = False) -> bool:
+        return _settings.get(studio_id, _EMPTY).bools.get(key, default)
+
+    @staticmethod
+    def invalidate_cache(studio_id: Optional[int] = None) -> None:
+        studio_ids = list(_settings) if studio_id is None else [studio_id]
         if studio_id is None:
-            cls._cache = {}
+            _settings.clear()
         else:
-            cls._cache.pop(studio_id, None)
+            _settings.pop(studio_id, None)
+        for sid in studio_ids:
+            SettingsService._drop_snapshot(sid)
 
     async def get_all(self, studio_id: int) -> list[Setting]:
         query = (
@@ -77,14 +206,36 @@ class SettingsService:
         return result.scalar_one_or_none()
 
     async def set_value(self, studio_id: int, key: str, value: Any) -> Setting:
-        setting = await self.get_by_key(studio_id, key)
+        # UPDATE ... RETURNING: одна операция вместо SELECT + UPDATE
+        stmt = (
+            update(Setting)
+            .where(Setting.studio_id == studio_id, Setting.key == key)
+            .values(value=str(value))
+            .returning(Setting)
+            .execution_options(populate_existing=True)
+        )
+        setting = (await self.session.execute(stmt)).scalar_one_or_none()
         if not setting:
             raise ValueError(f"Настройка {key} не найдена для студии {studio_id}")
-        setting.value = str(value)
         await self.session.commit()
-        SettingsService._cache.setdefault(studio_id, {})[key] = setting.get_typed_value()
+        SettingsService._store_for(studio_id, key, setting.get_typed_value())
         return setting
 
+    async def seed_defaults(self, studio_id: int) -> int:
+        """Досевает недостающие настройки по умолчанию одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Существующие значения не трогаются. Returns количество добавленных настроек.
+        """
+        stmt = (
+            dialect_insert(self.session, Setting)
+            .values([{**d._asdict(), "studio_id": studio_id} for d in DEFAULT_SETTINGS])
+            .on_conflict_do_nothing(index_elements=[Setting.studio_id, Setting.key])
+            .returning(Setting.key)
+        )
+        added = len((await self.session.execute(stmt)).all())
+        await self.session.commit()
+        return added
+
     async def create_setting(
         self,
         studio_id: int,
@@ -108,7 +259,7 @@ class SettingsService:
         )
         self.session.add(setting)
         await self.session.commit()
-        SettingsService._cache.setdefault(studio_id, {})[key] = setting.get_typed_value()
+        SettingsService._store_for(studio_id, key, setting.get_typed_value())
         return setting
 
 
@@ -164,280 +315,301 @@ class SettingKeys:
     RESTART_REQUESTED = "restart_requested"  # "true" / "false"
     RESTART_SCHEDULED_TIME = "restart_scheduled_time"  # ISO datetime или пустая строка
 
+    @staticmethod
+    def get_default(key: str) -> Optional["DefaultSetting"]:
+        """Настройка по умолчанию для ключа (None — ключа нет среди дефолтов)."""
+        return DEFAULT_SETTINGS_BY_KEY.get(key)
+
+
+class DefaultSetting(NamedTuple):
+    """Настройка по умолчанию, которой засевается каждая новая студия."""
+    key: str
+    value: str
+    value_type: SettingType
+    display_name: str
+    description: str
+    group: str
+    sort_order: int
+
 
 # Значения по умолчанию
-DEFAULT_SETTINGS = [
+DEFAULT_SETTINGS: Tuple[DefaultSetting, ...] = (
     # Основные
-    {
-        "key": SettingKeys.MIN_PHOTOS,
-        "value": "10",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Минимальное количество фото",
-        "description": "Минимальное количество фотографий для оформления заказа",
-        "group": "general",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.PREVIEW_MODE,
-        "value": "thumbnail",
-        "value_type": SettingType.STRING,
-        "display_name": "Режим превью документов",
-        "description": "thumbnail — показывать как фото, document — показывать как документ",
-        "group": "general",
-        "sort_order": 2,
-    },
+    DefaultSetting(
+        key=SettingKeys.MIN_PHOTOS,
+        value="10",
+        value_type=SettingType.INTEGER,
+        display_name="Минимальное количество фото",
+        description="Минимальное количество фотографий для оформления заказа",
+        group="general",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.PREVIEW_MODE,
+        value="thumbnail",
+        value_type=SettingType.STRING,
+        display_name="Режим превью документов",
+        description="thumbnail — показывать как фото, document — показывать как документ",
+        group="general",
+        sort_order=2,
+    ),
     # Кадрирование
-    {
-        "key": SettingKeys.CROP_ENABLED,
-        "value": "true",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "Включить кадрирование",
-        "description": "Предлагать клиентам настроить кадрирование фото перед печатью",
-        "group": "crop",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.SMART_CROP_ENABLED,
-        "value": "true",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "Умный авто-кроп",
-        "description": "Автоматически определять лица и важные области для кадрирования",
-        "group": "crop",
-        "sort_order": 2,
-    },
-    {
-        "key": SettingKeys.CROP_FACE_PRIORITY,
-        "value": "80",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Приоритет лиц (0-100)",
-        "description": "Насколько важно центрировать кроп на лицах. 100 = всегда по лицу, 0 = игнорировать лица",
-        "group": "crop",
-        "sort_order": 3,
-    },
-    {
-        "key": SettingKeys.CROP_CONFIDENCE_THRESHOLD,
-        "value": "85",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Порог авто-подтверждения (%)",
-        "description": "Если уверенность кропа выше этого порога — не спрашивать подтверждение у клиента",
-        "group": "crop",
-        "sort_order": 4,
-    },
-    {
-        "key": SettingKeys.CROP_SHOW_EDITOR,
-        "value": "problems_only",
-        "value_type": SettingType.STRING,
-        "display_name": "Показывать редактор кропа",
-        "description": "always — всегда, problems_only — только для проблемных фото, never — никогда",
-        "group": "crop",
-        "sort_order": 5,
-    },
+    DefaultSetting(
+        key=SettingKeys.CROP_ENABLED,
+        value="true",
+        value_type=SettingType.BOOLEAN,
+        display_name="Включить кадрирование",
+        description="Предлагать клиентам настроить кадрирование фото перед печатью",
+        group="crop",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.SMART_CROP_ENABLED,
+        value="true",
+        value_type=SettingType.BOOLEAN,
+        display_name="Умный авто-кроп",
+        description="Автоматически определять лица и важные области для кадрирования",
+        group="crop",
+        sort_order=2,
+    ),
+    DefaultSetting(
+        key=SettingKeys.CROP_FACE_PRIORITY,
+        value="80",
+        value_type=SettingType.INTEGER,
+        display_name="Приоритет лиц (0-100)",
+        description="Насколько важно центрировать кроп на лицах. 100 = всегда по лицу, 0 = игнорировать лица",
+        group="crop",
+        sort_order=3,
+    ),
+    DefaultSetting(
+        key=SettingKeys.CROP_CONFIDENCE_THRESHOLD,
+        value="85",
+        value_type=SettingType.INTEGER,
+        display_name="Порог авто-подтверждения (%)",
+        description="Если уверенность кропа выше этого порога — не спрашивать подтверждение у клиента",
+        group="crop",
+        sort_order=4,
+    ),
+    DefaultSetting(
+        key=SettingKeys.CROP_SHOW_EDITOR,
+        value="problems_only",
+        value_type=SettingType.STRING,
+        display_name="Показывать редактор кропа",
+        description="always — всегда, problems_only — только для проблемных фото, never — никогда",
+        group="crop",
+        sort_order=5,
+    ),
     # Доставка — ОЗОН
-    {
-        "key": SettingKeys.DELIVERY_OZON_ENABLED,
-        "value": "true",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "ОЗОН доставка",
-        "description": "Включить/выключить доставку через ОЗОН",
-        "group": "delivery_ozon",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.DELIVERY_OZON_PRICE,
-        "value": "100",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Стоимость",
-        "description": "Стоимость доставки ОЗОН в рублях",
-        "group": "delivery_ozon",
-        "sort_order": 2,
-    },
-    {
-        "key": SettingKeys.DELIVERY_OZON_NAME,
-        "value": "ОЗОН доставка",
-        "value_type": SettingType.STRING,
-        "display_name": "Название",
-        "description": "Название для кнопки в боте",
-        "group": "delivery_ozon",
-        "sort_order": 3,
-    },
-    {
-        "key": SettingKeys.DELIVERY_OZON_DESCRIPTION,
-        "value": "Доставка в пункт выдачи ОЗОН\n• Срок: от 4 дней\n• Необходимо приложение ОЗОН",
-        "value_type": SettingType.TEXT,
-        "display_name": "Описание",
-        "description": "Описание способа доставки (показывается клиенту)",
-        "group": "delivery_ozon",
-        "sort_order": 4,
-    },
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_OZON_ENABLED,
+        value="true",
+        value_type=SettingType.BOOLEAN,
+        display_name="ОЗОН доставка",
+        description="Включить/выключить доставку через ОЗОН",
+        group="delivery_ozon",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_OZON_PRICE,
+        value="100",
+        value_type=SettingType.INTEGER,
+        display_name="Стоимость",
+        description="Стоимость доставки ОЗОН в рублях",
+        group="delivery_ozon",
+        sort_order=2,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_OZON_NAME,
+        value="ОЗОН доставка",
+        value_type=SettingType.STRING,
+        display_name="Название",
+        description="Название для кнопки в боте",
+        group="delivery_ozon",
+        sort_order=3,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_OZON_DESCRIPTION,
+        value="Доставка в пункт выдачи ОЗОН\n• Срок: от 4 дней\n• Необходимо приложение ОЗОН",
+        value_type=SettingType.TEXT,
+        display_name="Описание",
+        description="Описание способа доставки (показывается клиенту)",
+        group="delivery_ozon",
+        sort_order=4,
+    ),
     # Доставка — Курьер
-    {
-        "key": SettingKeys.DELIVERY_COURIER_ENABLED,
-        "value": "true",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "Курьерская доставка",
-        "description": "Включить/выключить курьерскую доставку",
-        "group": "delivery_courier",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.DELIVERY_COURIER_PRICE,
-        "value": "0",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Стоимость",
-        "description": "Стоимость доставки курьером в рублях (0 = по согласованию)",
-        "group": "delivery_courier",
-        "sort_order": 2,
-    },
-    {
-        "key": SettingKeys.DELIVERY_COURIER_NAME,
-        "value": "Курьером по Москве",
-        "value_type": SettingType.STRING,
-        "display_name": "Название",
-        "description": "Название для кнопки в боте",
-        "group": "delivery_courier",
-        "sort_order": 3,
-    },
-    {
-        "key": SettingKeys.DELIVERY_COURIER_DESCRIPTION,
-        "value": "Служба Достависта\n• Время и стоимость по согласованию",
-        "value_type": SettingType.TEXT,
-        "display_name": "Описание",
-        "description": "Описание способа доставки (показывается клиенту)",
-        "group": "delivery_courier",
-        "sort_order": 4,
-    },
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_COURIER_ENABLED,
+        value="true",
+        value_type=SettingType.BOOLEAN,
+        display_name="Курьерская доставка",
+        description="Включить/выключить курьерскую доставку",
+        group="delivery_courier",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_COURIER_PRICE,
+        value="0",
+        value_type=SettingType.INTEGER,
+        display_name="Стоимость",
+        description="Стоимость доставки курьером в рублях (0 = по согласованию)",
+        group="delivery_courier",
+        sort_order=2,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_COURIER_NAME,
+        value="Курьером по Москве",
+        value_type=SettingType.STRING,
+        display_name="Название",
+        description="Название для кнопки в боте",
+        group="delivery_courier",
+        sort_order=3,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_COURIER_DESCRIPTION,
+        value="Служба Достависта\n• Время и стоимость по согласованию",
+        value_type=SettingType.TEXT,
+        display_name="Описание",
+        description="Описание способа доставки (показывается клиенту)",
+        group="delivery_courier",
+        sort_order=4,
+    ),
     # Доставка — Самовывоз
-    {
-        "key": SettingKeys.DELIVERY_PICKUP_ENABLED,
-        "value": "true",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "Самовывоз",
-        "description": "Включить/выключить самовывоз",
-        "group": "delivery_pickup",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.DELIVERY_PICKUP_NAME,
-        "value": "Самовывоз",
-        "value_type": SettingType.STRING,
-        "display_name": "Название",
-        "description": "Название для кнопки в боте",
-        "group": "delivery_pickup",
-        "sort_order": 2,
-    },
-    {
-        "key": SettingKeys.DELIVERY_PICKUP_ADDRESS,
-        "value": "г. Москва, м. Чертановская\nБалаклавский пр-т 12к3, подъезд 1",
-        "value_type": SettingType.TEXT,
-        "display_name": "Адрес самовывоза",
-        "description": "Адрес пункта самовывоза (показывается клиенту)",
-        "group": "delivery_pickup",
-        "sort_order": 3,
-    },
-    {
-        "key": SettingKeys.DELIVERY_PICKUP_DESCRIPTION,
-        "value": "Время по согласованию с менеджером",
-        "value_type": SettingType.TEXT,
-        "display_name": "Описание",
-        "description": "Дополнительная информация о самовывозе",
-        "group": "delivery_pickup",
-        "sort_order": 4,
-    },
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_PICKUP_ENABLED,
+        value="true",
+        value_type=SettingType.BOOLEAN,
+        display_name="Самовывоз",
+        description="Включить/выключить самовывоз",
+        group="delivery_pickup",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_PICKUP_NAME,
+        value="Самовывоз",
+        value_type=SettingType.STRING,
+        display_name="Название",
+        description="Название для кнопки в боте",
+        group="delivery_pickup",
+        sort_order=2,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_PICKUP_ADDRESS,
+        value="г. Москва, м. Чертановская\nБалаклавский пр-т 12к3, подъезд 1",
+        value_type=SettingType.TEXT,
+        display_name="Адрес самовывоза",
+        description="Адрес пункта самовывоза (показывается клиенту)",
+        group="delivery_pickup",
+        sort_order=3,
+    ),
+    DefaultSetting(
+        key=SettingKeys.DELIVERY_PICKUP_DESCRIPTION,
+        value="Время по согласованию с менеджером",
+        value_type=SettingType.TEXT,
+        display_name="Описание",
+        description="Дополнительная информация о самовывозе",
+        group="delivery_pickup",
+        sort_order=4,
+    ),
     # Общие настройки доставки
-    {
-        "key": SettingKeys.FREE_DELIVERY_THRESHOLD,
-        "value": "0",
-        "value_type": SettingType.INTEGER,
-        "display_name": "Бесплатная доставка от суммы",
-        "description": "Сумма заказа для бесплатной доставки (0 = отключено)",
-        "group": "delivery_general",
-        "sort_order": 1,
-    },
+    DefaultSetting(
+        key=SettingKeys.FREE_DELIVERY_THRESHOLD,
+        value="0",
+        value_type=SettingType.INTEGER,
+        display_name="Бесплатная доставка от суммы",
+        description="Сумма заказа для бесплатной доставки (0 = отключено)",
+        group="delivery_general",
+        sort_order=1,
+    ),
     # Контакты
-    {
-        "key": SettingKeys.MANAGER_USERNAME,
-        "value": "@manager",
-        "value_type": SettingType.STRING,
-        "display_name": "Username менеджера",
-        "description": "Telegram username менеджера для связи",
-        "group": "contacts",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.PAYMENT_PHONE,
-        "value": "+7 (999) 123-45-67",
-        "value_type": SettingType.STRING,
-        "display_name": "Телефон для оплаты",
-        "description": "Номер телефона для перевода по СБП",
-        "group": "contacts",
-        "sort_order": 2,
-    },
-    {
-        "key": SettingKeys.PAYMENT_CARD,
-        "value": "1234 5678 9012 3456",
-        "value_type": SettingType.STRING,
-        "display_name": "Номер карты",
-        "description": "Номер карты для оплаты переводом",
-        "group": "contacts",
-        "sort_order": 3,
-    },
-    {
-        "key": SettingKeys.PAYMENT_RECEIVER,
-        "value": "Имя Фамилия",
-        "value_type": SettingType.STRING,
-        "display_name": "Получатель платежа",
-        "description": "ФИО получателя для подтверждения перевода",
-        "group": "contacts",
-        "sort_order": 4,
-    },
+    DefaultSetting(
+        key=SettingKeys.MANAGER_USERNAME,
+        value="@manager",
+        value_type=SettingType.STRING,
+        display_name="Username менеджера",
+        description="Telegram username менеджера для связи",
+        group="contacts",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.PAYMENT_PHONE,
+        value="+7 (999) 123-45-67",
+        value_type=SettingType.STRING,
+        display_name="Телефон для оплаты",
+        description="Номер телефона для перевода по СБП",
+        group="contacts",
+        sort_order=2,
+    ),
+    DefaultSetting(
+        key=SettingKeys.PAYMENT_CARD,
+        value="1234 5678 9012 3456",
+        value_type=SettingType.STRING,
+        display_name="Номер карты",
+        description="Номер карты для оплаты переводом",
+        group="contacts",
+        sort_order=3,
+    ),
+    DefaultSetting(
+        key=SettingKeys.PAYMENT_RECEIVER,
+        value="Имя Фамилия",
+        value_type=SettingType.STRING,
+        display_name="Получатель платежа",
+        description="ФИО получателя для подтверждения перевода",
+        group="contacts",
+        sort_order=4,
+    ),
     # Бот
-    {
-        "key": SettingKeys.WELCOME_MESSAGE,
-        "value": "Здравствуйте! 👋\n\nЯ бот приёма заказов <b>{studio_name}</b>!\n\nКакой формат фотографий вы хотите напечатать?\n\n📷 <b>Форматы:</b>\n{formats}\n\nДля связи с менеджером: @{manager}",
-        "value_type": SettingType.TEXT,
-        "display_name": "Приветственное сообщение",
-        "description": "Шаблон приветствия. Переменные: {studio_name} — название студии, {formats} — список форматов, {manager} — username менеджера",
-        "group": "bot",
-        "sort_order": 1,
-    },
+    DefaultSetting(
+        key=SettingKeys.WELCOME_MESSAGE,
+        value="Здравствуйте! 👋\n\nЯ бот приёма заказов <b>{studio_name}</b>!\n\nКакой формат фотографий вы хотите напечатать?\n\n📷 <b>Форматы:</b>\n{formats}\n\nДля связи с менеджером: @{manager}",
+        value_type=SettingType.TEXT,
+        display_name="Приветственное сообщение",
+        description="Шаблон приветствия. Переменные: {studio_name} — название студии, {formats} — список форматов, {manager} — username менеджера",
+        group="bot",
+        sort_order=1,
+    ),
     # Подписка
-    {
-        "key": SettingKeys.SUBSCRIPTION_CHANNEL,
-        "value": "",
-        "value_type": SettingType.STRING,
-        "display_name": "Канал для проверки подписки",
-        "description": "Username канала (напр. @photo28studio) или его ID. Бот должен быть администратором канала. Оставьте пустым если не используете.",
-        "group": "subscription",
-        "sort_order": 1,
-    },
+    DefaultSetting(
+        key=SettingKeys.SUBSCRIPTION_CHANNEL,
+        value="",
+        value_type=SettingType.STRING,
+        display_name="Канал для проверки подписки",
+        description="Username канала (напр. @photo28studio) или его ID. Бот должен быть администратором канала. Оставьте пустым если не используете.",
+        group="subscription",
+        sort_order=1,
+    ),
     # Уведомления
-    {
-        "key": SettingKeys.MANAGER_CHAT_ID,
-        "value": "",
-        "value_type": SettingType.STRING,
-        "display_name": "ID чата менеджеров",
-        "description": "ID группы/чата для уведомлений о заказах. Используйте /chatid в группе чтобы узнать ID.",
-        "group": "notifications",
-        "sort_order": 1,
-    },
+    DefaultSetting(
+        key=SettingKeys.MANAGER_CHAT_ID,
+        value="",
+        value_type=SettingType.STRING,
+        display_name="ID чата менеджеров",
+        description="ID группы/чата для уведомлений о заказах. Используйте /chatid в группе чтобы узнать ID.",
+        group="notifications",
+        sort_order=1,
+    ),
     # Системные
-    {
-        "key": SettingKeys.RESTART_REQUESTED,
-        "value": "false",
-        "value_type": SettingType.BOOLEAN,
-        "display_name": "Перезапуск запрошен",
-        "description": "",
-        "group": "system",
-        "sort_order": 1,
-    },
-    {
-        "key": SettingKeys.RESTART_SCHEDULED_TIME,
-        "value": "",
-        "value_type": SettingType.STRING,
-        "display_name": "Запланированное время перезапуска",
-        "description": "",
-        "group": "system",
-        "sort_order": 2,
-    },
-]
+    DefaultSetting(
+        key=SettingKeys.RESTART_REQUESTED,
+        value="false",
+        value_type=SettingType.BOOLEAN,
+        display_name="Перезапуск запрошен",
+        description="",
+        group="system",
+        sort_order=1,
+    ),
+    DefaultSetting(
+        key=SettingKeys.RESTART_SCHEDULED_TIME,
+        value="",
+        value_type=SettingType.STRING,
+        display_name="Запланированное время перезапуска",
+        description="",
+        group="system",
+        sort_order=2,
+    ),
+)
+
 
+# Индекс дефолтов по ключу, собранный при импорте; только для чтения
+DEFAULT_SETTINGS_BY_KEY: Mapping[str, DefaultSetting] = MappingProxyType(
+    {d.key: d for d in DEFAULT_SETTINGS}
+)
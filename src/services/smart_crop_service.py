@@ -1,43 +1,152 @@
 """Сервис умного кадрирования с определением лиц."""
+import asyncio
+import functools
 import io
 import logging
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import Optional, Tuple
 import json
 
+from src.config import settings
+
 logger = logging.getLogger(__name__)
 
+# Длинная сторона кадра, на котором ищутся лица: детектору хватает
+# уменьшенной копии, полноразмерное фото обрабатывать незачем
+YUNET_INPUT_SIZE = 320
+HAAR_INPUT_SIZE = 640
+# Для saliency достаточно грубой карты: ищется только положение максимума
+SALIENCY_INPUT_SIZE = 256
+# Фото, чьи пропорции отличаются от целевых меньше чем на 1%, не кадрируются
+IDENTITY_RATIO_TOLERANCE = 0.01
+# Флаги imdecode по коэффициенту уменьшения: libjpeg масштабирует прямо
+# в DCT-домене, не раскодируя полноразмерный кадр
+_REDUCED_DECODE_FLAGS = (
+    (8, "IMREAD_REDUCED_COLOR_8"),
+    (4, "IMREAD_REDUCED_COLOR_4"),
+    (2, "IMREAD_REDUCED_COLOR_2"),
+)
+
+# Асинхронный анализ: сколько фото обрабатывается параллельно в пуле потоков
+CROP_WORKERS = 2
+# Детектор общий на процесс, а OpenCV не гарантирует потокобезопасность
+# одного объекта — декодирование идёт параллельно, сам поиск лиц по очереди
+_detector_lock = threading.Lock()
+# Остальные OpenCV-объекты и буферы у каждого потока пула свои
+_thread_state = threading.local()
+
 # Ленивая загрузка тяжёлых библиотек
 cv2 = None
 np = None
+# Загрузку могут начать сразу несколько потоков пула кропа
+_cv2_lock = threading.Lock()
 
 
 def _load_cv2():
     """Ленивая загрузка OpenCV."""
     global cv2, np
-    if cv2 is None:
-        try:
-            import cv2 as _cv2
-            import numpy as _np
-            cv2 = _cv2
+    if cv2 is not None:
+        return True
+    with _cv2_lock:
+        if cv2 is None:
+            try:
+                import cv2 as _cv2
+                import numpy as _np
+            except ImportError:
+                logger.warning("OpenCV не установлен. Умный кроп недоступен.")
+                return False
+            # cv2 публикуется последним: кто увидел cv2, видит и np
             np = _np
+            cv2 = _cv2
             logger.info("OpenCV загружен успешно")
-        except ImportError:
-            logger.warning("OpenCV не установлен. Умный кроп недоступен.")
-            return False
     return True
 
 
-@dataclass
+def _get_saliency():
+    """Saliency-детектор текущего потока; None — нет модуля cv2.saliency (contrib)."""
+    if not hasattr(_thread_state, "saliency"):
+        try:
+            _thread_state.saliency = cv2.saliency.StaticSaliencyFineGrained_create()
+        except AttributeError:
+            logger.info("cv2.saliency недоступен (нужен opencv-contrib) — saliency-кроп пропускается")
+            _thread_state.saliency = None
+    return _thread_state.saliency
+
+
+def _gray_buffer(width: int, height: int):
+    """Переиспользуемый буфер потока под grayscale-кадр детектора (≤ HAAR_INPUT_SIZE)."""
+    buffer = getattr(_thread_state, "gray", None)
+    if buffer is None:
+        buffer = _thread_state.gray = np.empty(
+            (HAAR_INPUT_SIZE, HAAR_INPUT_SIZE), dtype=np.uint8
+        )
+    return buffer[:height, :width]
+
+
+def _clamp(value: int, low: int, high: int) -> int:
+    """Зажимает value в [low, high] одним сравнением на границу."""
+    return low if value < low else high if value > high else value
+
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# SOF-маркеры JPEG с размерами кадра (C4, C8, CC — DHT, JPG, DAC — не они)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _peek_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(ширина, высота) из заголовка JPEG/PNG без декодирования; None — не распознан."""
+    if data[:8] == _PNG_SIGNATURE and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    # Идём по сегментам, а не ищем маркер в байтах: в APP1 (EXIF) бывает
+    # превью со своим SOF
+    i, size = 2, len(data)
+    while i + 9 <= size:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # байт-заполнитель
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+@functools.lru_cache(maxsize=1)
+def _load_face_detector():
+    """Детектор лиц, один на процесс (модель/XML разбираются один раз).
+
+    YuNet (DNN, векторизованные ядра OpenCV), если модель лежит по пути
+    из настроек; иначе — каскад Хаара, который идёт в комплекте с OpenCV.
+    """
+    model_path = settings.face_detector_model
+    if model_path.is_file():
+        return cv2.FaceDetectorYN.create(
+            str(model_path), "", (YUNET_INPUT_SIZE, YUNET_INPUT_SIZE),
+            backend_id=cv2.dnn.DNN_BACKEND_OPENCV,
+            target_id=cv2.dnn.DNN_TARGET_CPU,
+        )
+    cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+    return cv2.CascadeClassifier(cascade_path)
+
+
+@dataclass(slots=True, frozen=True)
 class CropResult:
-    """Результат анализа кропа."""
+    """Результат анализа кропа (неизменяемый, без __dict__ на экземпляр)."""
     x: int  # Координата X левого верхнего угла
     y: int  # Координата Y левого верхнего угла
     width: int  # Ширина области кропа
     height: int  # Высота области кропа
     confidence: float  # Уверенность в кропе (0-1)
     faces_found: int  # Количество найденных лиц
-    method: str  # Метод: "face", "saliency", "center"
+    method: str  # Метод: "face", "saliency", "center", "identity"
     
     def to_dict(self) -> dict:
         """Преобразует в словарь для JSON."""
@@ -65,18 +174,12 @@ class SmartCropService:
             face_priority: Приоритет лиц (0-100). 100 = всегда по лицу.
         """
         self.face_priority = face_priority / 100.0
-        self._face_cascade = None
     
-    def _get_face_cascade(self):
-        """Ленивая загрузка каскада для определения лиц."""
+    def _get_face_detector(self):
+        """Ленивая загрузка детектора лиц (общего для всех экземпляров)."""
         if not _load_cv2():
             return None
-        
-        if self._face_cascade is None:
-            cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-            self._face_cascade = cv2.CascadeClassifier(cascade_path)
-        
-        return self._face_cascade
+        return _load_face_detector()
     
     def analyze_photo(
         self,
@@ -97,8 +200,9 @@ class SmartCropService:
             return self._fallback_center_crop(image_bytes, aspect_ratio)
         
         try:
+            original_size = self._image_size(image_bytes)
             nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            img = cv2.imdecode(nparr, self._decode_flag(original_size))
             
             if img is None:
                 logger.error("Не удалось декодировать изображение")
@@ -106,79 +210,181 @@ class SmartCropService:
             
             img_height, img_width = img.shape[:2]
             target_ratio = aspect_ratio
+            if original_size and (
+                (original_size[0] > original_size[1]) != (img_width > img_height)
+            ):
+                # imdecode применил EXIF-поворот, а заголовок хранит размеры до него
+                original_size = original_size[::-1]
+            
+            # Пропорции уже совпадают с форматом — детекция не нужна
+            if abs(img_width / img_height / target_ratio - 1) < IDENTITY_RATIO_TOLERANCE:
+                frame_width, frame_height = original_size or (img_width, img_height)
+                return CropResult(
+                    x=0,
+                    y=0,
+                    width=frame_width,
+                    height=frame_height,
+                    confidence=1.0,
+                    faces_found=0,
+                    method="identity"
+                )
+            
+            # Размер кропа одинаков для всех стратегий — считаем один раз
+            crop_width, crop_height = self._calculate_crop_size(
+                img_width, img_height, target_ratio
+            )
             
             # 1. Пробуем найти лица
             faces = self._detect_faces(img)
             
-            if faces and self.face_priority > 0:
+            if len(faces) and self.face_priority > 0:
                 crop = self._crop_around_faces(
-                    img_width, img_height, faces, target_ratio
+                    img_width, img_height, faces, crop_width, crop_height
+                )
+            else:
+                # 2. Если нет лиц — saliency detection,
+                # 3. не вышло — центральный кроп
+                crop = (
+                    self._saliency_crop(img, crop_width, crop_height)
+                    or self._center_crop(img_width, img_height, crop_width, crop_height)
                 )
-                return crop
-            
-            # 2. Если нет лиц — saliency detection
-            saliency_crop = self._saliency_crop(img, target_ratio)
-            if saliency_crop:
-                return saliency_crop
             
-            # 3. Fallback — центральный кроп
-            return self._center_crop(img_width, img_height, target_ratio)
+            if original_size and original_size != (img_width, img_height):
+                crop = self._to_original_scale(
+                    crop, img_width, img_height, original_size, target_ratio
+                )
+            return crop
             
         except Exception as e:
             logger.error(f"Ошибка анализа фото: {e}")
-            return self._fallback_center_crop(image_bytes, photo_format)
+            return self._fallback_center_crop(image_bytes, aspect_ratio)
+    
+    async def analyze_photo_async(
+        self,
+        image_bytes: bytes,
+        aspect_ratio: float = 0.76,
+    ) -> CropResult:
+        """analyze_photo в пуле потоков: не блокирует event loop, каждое фото —
+        отдельное задание, так что параллельные запросы занимают все потоки."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _crop_executor, self.analyze_photo, image_bytes, aspect_ratio
+        )
+    
+    @staticmethod
+    def _image_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+        """Размер изображения (ширина, высота) по заголовку, без декодирования."""
+        size = _peek_image_size(image_bytes)
+        if size:
+            return size
+        try:
+            from PIL import Image
+            return Image.open(io.BytesIO(image_bytes)).size
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _decode_flag(original_size: Optional[Tuple[int, int]]) -> int:
+        """Наибольшее уменьшение при декодировании, после которого детектору
+        ещё хватает пикселей."""
+        if original_size:
+            long_side = max(original_size)
+            for factor, flag_name in _REDUCED_DECODE_FLAGS:
+                if long_side // factor >= HAAR_INPUT_SIZE:
+                    return getattr(cv2, flag_name)
+        return cv2.IMREAD_COLOR
     
-    def _detect_faces(self, img) -> List[Tuple[int, int, int, int]]:
-        """Определяет лица на изображении."""
-        cascade = self._get_face_cascade()
-        if cascade is None:
-            return []
+    def _to_original_scale(
+        self,
+        crop: CropResult,
+        img_width: int,
+        img_height: int,
+        original_size: Tuple[int, int],
+        target_ratio: float,
+    ) -> CropResult:
+        """Переносит кроп с уменьшенного кадра на исходный, сохраняя центр."""
+        orig_width, orig_height = original_size
+        crop_width, crop_height = self._calculate_crop_size(
+            orig_width, orig_height, target_ratio
+        )
+        center_x = (crop.x + crop.width / 2) * orig_width / img_width
+        center_y = (crop.y + crop.height / 2) * orig_height / img_height
+        crop_x = _clamp(int(center_x - crop_width / 2), 0, orig_width - crop_width)
+        crop_y = _clamp(int(center_y - crop_height / 2), 0, orig_height - crop_height)
+        return CropResult(
+            x=crop_x,
+            y=crop_y,
+            width=crop_width,
+            height=crop_height,
+            confidence=crop.confidence,
+            faces_found=crop.faces_found,
+            method=crop.method,
+        )
+    
+    def _detect_faces(self, img):
+        """Определяет лица на уменьшенной копии.
+
+        Returns массив (N, 4) рамок x, y, w, h в координатах img.
+        """
+        detector = self._get_face_detector()
+        if detector is None:
+            return np.empty((0, 4), dtype=np.int32)
         
-        # Конвертируем в grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        is_haar = isinstance(detector, cv2.CascadeClassifier)
+        img_height, img_width = img.shape[:2]
+        input_size = HAAR_INPUT_SIZE if is_haar else YUNET_INPUT_SIZE
+        scale = min(1.0, input_size / max(img_width, img_height))
+        small_size = (max(1, round(img_width * scale)), max(1, round(img_height * scale)))
+        small = cv2.resize(img, small_size, interpolation=cv2.INTER_AREA) if scale < 1.0 else img
         
-        # Определяем лица
-        faces = cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30),
-            flags=cv2.CASCADE_SCALE_IMAGE
-        )
+        if is_haar:
+            small_height, small_width = small.shape[:2]
+            gray = cv2.cvtColor(
+                small, cv2.COLOR_BGR2GRAY, dst=_gray_buffer(small_width, small_height)
+            )
+            with _detector_lock:
+                faces = detector.detectMultiScale(
+                    gray,
+                    scaleFactor=1.1,
+                    minNeighbors=5,
+                    minSize=(20, 20),
+                    flags=cv2.CASCADE_SCALE_IMAGE
+                )
+        else:
+            with _detector_lock:
+                detector.setInputSize(small_size)
+                _, detected = detector.detect(small)
+            # Строка YuNet: x, y, w, h, 5 опорных точек, score
+            faces = () if detected is None else detected[:, :4]
         
-        # Преобразуем в список кортежей
-        return [(x, y, w, h) for (x, y, w, h) in faces]
+        if len(faces) == 0:
+            return np.empty((0, 4), dtype=np.int32)
+        # Масштабируем рамки обратно к исходному кадру
+        return (np.asarray(faces, dtype=np.float32) / scale).astype(np.int32)
     
     def _crop_around_faces(
         self,
         img_width: int,
         img_height: int,
-        faces: List[Tuple[int, int, int, int]],
-        target_ratio: float,
+        faces,
+        crop_width: int,
+        crop_height: int,
     ) -> CropResult:
-        """Создаёт кроп вокруг лиц."""
-        # Находим общий bounding box всех лиц
-        min_x = min(f[0] for f in faces)
-        min_y = min(f[1] for f in faces)
-        max_x = max(f[0] + f[2] for f in faces)
-        max_y = max(f[1] + f[3] for f in faces)
+        """Создаёт кроп вокруг лиц (faces — массив (N, 4) x, y, w, h)."""
+        # Общий bounding box всех лиц: две редукции по парам колонок (x, y)
+        corners_min = faces[:, :2].min(axis=0)
+        corners_max = (faces[:, :2] + faces[:, 2:]).max(axis=0)
         
         # Центр всех лиц
-        faces_center_x = (min_x + max_x) // 2
-        faces_center_y = (min_y + max_y) // 2
-        
-        # Вычисляем размер кропа с учётом соотношения сторон
-        crop_width, crop_height = self._calculate_crop_size(
-            img_width, img_height, target_ratio
-        )
+        faces_center_x, faces_center_y = ((corners_min + corners_max) // 2).tolist()
         
         # Центрируем кроп на лицах
         crop_x = faces_center_x - crop_width // 2
         crop_y = faces_center_y - crop_height // 2
         
         # Корректируем, чтобы не выходить за границы
-        crop_x = max(0, min(crop_x, img_width - crop_width))
-        crop_y = max(0, min(crop_y, img_height - crop_height))
+        crop_x = _clamp(crop_x, 0, img_width - crop_width)
+        crop_y = _clamp(crop_y, 0, img_height - crop_height)
         
         # Уверенность зависит от того, насколько хорошо лица попадают в кроп
         faces_in_crop = self._count_faces_in_crop(
@@ -203,15 +409,23 @@ class SmartCropService:
     def _saliency_crop(
         self,
         img,
-        target_ratio: float,
+        crop_width: int,
+        crop_height: int,
     ) -> Optional[CropResult]:
         """Определяет важные области методом saliency detection."""
+        saliency = _get_saliency()
+        if saliency is None:
+            return None
         try:
-            # Создаём saliency detector
-            saliency = cv2.saliency.StaticSaliencyFineGrained_create()
-            
-            # Вычисляем saliency map
-            success, saliency_map = saliency.computeSaliency(img)
+            # Считаем карту на уменьшенной копии
+            img_height, img_width = img.shape[:2]
+            scale = min(1.0, SALIENCY_INPUT_SIZE / max(img_width, img_height))
+            small = img if scale >= 1.0 else cv2.resize(
+                img,
+                (max(1, round(img_width * scale)), max(1, round(img_height * scale))),
+                interpolation=cv2.INTER_AREA,
+            )
+            success, saliency_map = saliency.computeSaliency(small)
             
             if not success:
                 return None
@@ -219,25 +433,21 @@ class SmartCropService:
             # Находим точку с максимальной "важностью"
             saliency_map = (saliency_map * 255).astype(np.uint8)
             
-            # Применяем blur для сглаживания
-            saliency_map = cv2.GaussianBlur(saliency_map, (51, 51), 0)
+            # На маленькой карте хватает дешёвого box-фильтра вместо Гаусса 51×51
+            saliency_map = cv2.blur(saliency_map, (9, 9))
             
-            # Находим максимум
+            # Находим максимум и переводим в координаты img
             _, _, _, max_loc = cv2.minMaxLoc(saliency_map)
-            center_x, center_y = max_loc
-            
-            img_height, img_width = img.shape[:2]
-            crop_width, crop_height = self._calculate_crop_size(
-                img_width, img_height, target_ratio
-            )
+            center_x = int(max_loc[0] / scale)
+            center_y = int(max_loc[1] / scale)
             
             # Центрируем на точке интереса
             crop_x = center_x - crop_width // 2
             crop_y = center_y - crop_height // 2
             
             # Корректируем границы
-            crop_x = max(0, min(crop_x, img_width - crop_width))
-            crop_y = max(0, min(crop_y, img_height - crop_height))
+            crop_x = _clamp(crop_x, 0, img_width - crop_width)
+            crop_y = _clamp(crop_y, 0, img_height - crop_height)
             
             return CropResult(
                 x=int(crop_x),
@@ -257,13 +467,10 @@ class SmartCropService:
         self,
         img_width: int,
         img_height: int,
-        target_ratio: float,
+        crop_width: int,
+        crop_height: int,
     ) -> CropResult:
         """Центральный кроп (fallback)."""
-        crop_width, crop_height = self._calculate_crop_size(
-            img_width, img_height, target_ratio
-        )
-        
         crop_x = (img_width - crop_width) // 2
         crop_y = (img_height - crop_height) // 2
         
@@ -299,23 +506,19 @@ class SmartCropService:
     
     def _count_faces_in_crop(
         self,
-        faces: List[Tuple[int, int, int, int]],
+        faces,
         crop_x: int,
         crop_y: int,
         crop_width: int,
         crop_height: int,
     ) -> int:
-        """Подсчитывает лица, попадающие в область кропа."""
-        count = 0
-        for (fx, fy, fw, fh) in faces:
-            face_center_x = fx + fw // 2
-            face_center_y = fy + fh // 2
-            
-            if (crop_x <= face_center_x <= crop_x + crop_width and
-                crop_y <= face_center_y <= crop_y + crop_height):
-                count += 1
-        
-        return count
+        """Подсчитывает лица, центр которых попадает в область кропа."""
+        centers = faces[:, :2] + faces[:, 2:] // 2
+        inside = (
+            (centers >= (crop_x, crop_y))
+            & (centers <= (crop_x + crop_width, crop_y + crop_height))
+        ).all(axis=1)
+        return int(inside.sum())
     
     def _fallback_center_crop(
         self,
@@ -323,12 +526,7 @@ class SmartCropService:
         aspect_ratio: float = 0.76,
     ) -> CropResult:
         """Fallback кроп без OpenCV (по центру с примерными размерами)."""
-        try:
-            from PIL import Image
-            img = Image.open(io.BytesIO(image_bytes))
-            img_width, img_height = img.size
-        except Exception:
-            img_width, img_height = 1920, 1080
+        img_width, img_height = self._image_size(image_bytes) or (1920, 1080)
         
         target_ratio = aspect_ratio
         crop_width, crop_height = self._calculate_crop_size(
@@ -351,13 +549,14 @@ class SmartCropService:
         return _load_cv2()
 
 
-# Глобальный экземпляр (создаётся лениво)
-_smart_crop_service: Optional[SmartCropService] = None
+_crop_executor = ThreadPoolExecutor(
+    max_workers=CROP_WORKERS, thread_name_prefix="smart-crop"
+)
 
 
+# Экземпляр на каждое значение приоритета: сам сервис лёгкий (детектор
+# общий), а студии с разными настройками не перетирают друг другу приоритет
+@functools.lru_cache(maxsize=None)
 def get_smart_crop_service(face_priority: int = 80) -> SmartCropService:
-    """Получает экземпляр SmartCropService."""
-    global _smart_crop_service
-    if _smart_crop_service is None:
-        _smart_crop_service = SmartCropService(face_priority)
-    return _smart_crop_service
+    """Получает экземпляр SmartCropService для заданного приоритета лиц."""
+    return SmartCropService(face_priority)
@@ -52,13 +52,13 @@ async def provision_studio(
     for s in DEFAULT_SETTINGS:
         session.add(Setting(
             studio_id=studio.id,
-            key=s["key"],
-            value=s["value"],
-            value_type=s["value_type"],
-            display_name=s.get("display_name", ""),
-            description=s.get("description", ""),
-            group=s.get("group", "general"),
-            sort_order=s.get("sort_order", 0),
+            key=s.key,
+            value=s.value,
+            value_type=s.value_type,
+            display_name=s.display_name,
+            description=s.description,
+            group=s.group,
+            sort_order=s.sort_order,
         ))
 
     for p in CATALOG_TEMPLATE:
@@ -1,55 +1,261 @@
 """Сервис интеграции с Яндекс.Диском."""
 import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import time
 import warnings
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+import aiohttp
 
 # yadisk_async uses deprecated aiohttp subclassing; suppress until dependency is updated.
 with warnings.catch_warnings():
     warnings.simplefilter("ignore", DeprecationWarning)
     import yadisk_async
+    from yadisk_async.session import SessionWithHeaders
 
 from src.config import settings
 from src.models.order import Order
 
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых загрузку имеет смысл повторить: сеть, таймаут, 5xx/429
+_RETRIABLE = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+    yadisk_async.exceptions.RetriableYaDiskError,
+)
+
+
+@lru_cache(maxsize=1024)
+def _order_folder(base: str, order_number: str, year: int, month: int) -> str:
+    """Путь папки заказа: base/YYYY-MM/order_number (без strftime)."""
+    return f"{base}/{year:04d}-{month:02d}/{order_number}"
+
+
+def _file_md5(path: str) -> str:
+    """MD5 файла, читая его блоками (вызывается в потоке)."""
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _prefetch(path: str) -> None:
+    """Просит ядро заранее прочитать файл в page cache (без копии в память процесса)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# Версия формата файла кеша папок: при смене структуры старые файлы игнорируются
+_FOLDER_CACHE_VERSION = 1
+
+
+class _PooledYaDisk(yadisk_async.YaDisk):
+    """YaDisk, чья сессия держит пул keep-alive соединений и кеш DNS.
+
+    Сессию клиент и так кеширует на время жизни; здесь настраивается её
+    коннектор: пул под параллельные загрузки, соединения живут между
+    запросами пачки, имя cloud-api.yandex.net не резолвится на каждый вызов.
+    """
+
+    def make_session(self, token: Optional[str] = None) -> SessionWithHeaders:
+        if token is None:
+            token = self.token
+        session = SessionWithHeaders(
+            connector=aiohttp.TCPConnector(
+                limit=max(16, settings.yandex_upload_concurrency * 2),
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+        )
+        if token:
+            session.headers["Authorization"] = "OAuth " + token
+        return session
+
 
 class YandexDiskService:
     """Сервис для работы с Яндекс.Диском."""
     
     BASE_FOLDER = "/Photo28_Orders"
     
+    # Файлы крупнее порога (RAW/TIFF) грузятся первыми и с долгим таймаутом
+    # ожидания ответа: после приёма тела Диск отвечает не сразу
+    LARGE_UPLOAD_BYTES = 32 * 1024 * 1024
+    LARGE_UPLOAD_TIMEOUT = aiohttp.ClientTimeout(sock_connect=10.0, sock_read=120.0)
+    
+    # Попытки загрузки файла и базовая пауза между ними (0.5, 1, 2 с)
+    UPLOAD_ATTEMPTS = 4
+    UPLOAD_RETRY_DELAY = 0.5
+    
+    # Сколько папок-месяцев листаем одновременно
+    LIST_CONCURRENCY = 8
+    
+    # Папки, которые точно есть на Диске: общий на процесс кеш, чтобы
+    # следующие заказы того же месяца не ходили в API за папками вовсе
+    _known_folders: set[str] = set()
+    # Кеш папок на диске: когда заведён (для TTL), поднят ли, есть ли новое
+    _folders_created_at: float = 0.0
+    _folders_loaded = False
+    _folders_dirty = False
+    
+    # Результат check_token по токену: {token: (годен_до_monotonic, ok)}
+    TOKEN_CHECK_TTL = 60.0
+    _token_checks: dict[str, tuple[float, bool]] = {}
+    
+    # Публичные ссылки папок заказов: {order_folder: (годен_до_monotonic, url)}.
+    # LRU на PUBLIC_URL_CACHE_SIZE записей; TTL — чтобы снятая с публикации
+    # папка не отдавала старую ссылку вечно
+    PUBLIC_URL_CACHE_SIZE = 256
+    PUBLIC_URL_TTL = 600.0
+    _public_url_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+    
     def __init__(self):
         self.token = settings.yandex_disk_token
         self._client: Optional[yadisk_async.YaDisk] = None
+        self._load_known_folders()
     
     @property
     def client(self) -> yadisk_async.YaDisk:
         """Ленивая инициализация клиента."""
         if self._client is None:
-            self._client = yadisk_async.YaDisk(token=self.token)
+            self._client = _PooledYaDisk(token=self.token)
         return self._client
     
     async def check_connection(self) -> bool:
-        """Проверяет подключение к Яндекс.Диску."""
+        """Проверяет подключение к Яндекс.Диску (ответ API кешируется на TOKEN_CHECK_TTL)."""
+        now = time.monotonic()
+        cached = self._token_checks.get(self.token)
+        if cached and now < cached[0]:
+            return cached[1]
         try:
-            return await self.client.check_token()
+            ok = await self.client.check_token()
         except Exception:
+            # Сетевую ошибку не кешируем — следующая проверка пойдёт в API
             return False
+        self._token_checks[self.token] = (now + self.TOKEN_CHECK_TTL, ok)
+        return ok
+    
+    @classmethod
+    def invalidate_token_cache(cls, token: Optional[str] = None) -> None:
+        """Сбрасывает кеш проверки токена (например, после 401)."""
+        if token is None:
+            cls._token_checks.clear()
+        else:
+            cls._token_checks.pop(token, None)
     
     async def ensure_folder(self, path: str) -> None:
-        """Создаёт папку, если она не существует."""
+        """Создаёт папку (и недостающих родителей), если она не существует.
+
+        Сразу делает mkdir без предварительного exists: «уже существует»
+        приходит ошибкой PathExistsError, и это тот же результат. Начинаем
+        с самой глубокой папки — обычно родители уже есть, и хватает одного
+        запроса; к родителям поднимаемся только по ParentNotFoundError.
+        Прочие ошибки API логируются и пробрасываются вызывающему.
+        """
+        if path in self._known_folders:
+            return
         try:
-            if not await self.client.exists(path):
+            try:
                 await self.client.mkdir(path)
-        except Exception as e:
-            # Папка может уже существовать
+            except yadisk_async.exceptions.ParentNotFoundError:
+                parent = path.rsplit("/", 1)[0]
+                if not parent:
+                    raise
+                await self.ensure_folder(parent)
+                await self.client.mkdir(path)
+        except yadisk_async.exceptions.PathExistsError:
             pass
+        except Exception:
+            # Токен, квота, сеть: папки нет — загружать в неё бессмысленно
+            logger.exception("Не удалось создать папку %s на Я.Диске", path)
+            raise
+        # Раз папка есть, есть и все её родители
+        while path and path not in self._known_folders:
+            self._known_folders.add(path)
+            YandexDiskService._folders_dirty = True
+            path = path.rsplit("/", 1)[0]
+    
+    @classmethod
+    def _forget_folder(cls, path: str) -> None:
+        """Убирает папку и всех её родителей из кеша известных папок."""
+        while path:
+            if path in cls._known_folders:
+                cls._known_folders.discard(path)
+                cls._folders_dirty = True
+            path = path.rsplit("/", 1)[0]
+    
+    # === Кеш папок на диске ===
+    
+    @staticmethod
+    def _folders_path() -> Path:
+        return settings.cache_snapshot_dir / "yandex_folders.pkl"
+    
+    @classmethod
+    def _load_known_folders(cls) -> None:
+        """Один раз за процесс поднимает известные папки из файла (если кеш включён)."""
+        if cls._folders_loaded:
+            return
+        cls._folders_loaded = True
+        cls._folders_created_at = time.time()
+        ttl = settings.yandex_folder_cache_ttl
+        if ttl <= 0:
+            return
+        try:
+            with open(cls._folders_path(), "rb") as f:
+                version, created_at, folders = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            return
+        # Папку могли удалить руками — поэтому кеш целиком живёт не дольше TTL
+        if version != _FOLDER_CACHE_VERSION or time.time() - created_at > ttl:
+            return
+        cls._folders_created_at = created_at
+        cls._known_folders.update(folders)
+    
+    @classmethod
+    def _save_known_folders(cls) -> None:
+        """Сохраняет известные папки в файл, если появились новые."""
+        if not cls._folders_dirty or settings.yandex_folder_cache_ttl <= 0:
+            return
+        path = cls._folders_path()
+        tmp = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(
+                    (_FOLDER_CACHE_VERSION, cls._folders_created_at, cls._known_folders),
+                    f,
+                    protocol=5,
+                )
+            # Атомарная замена: читатель не увидит недописанный файл
+            os.replace(tmp, path)
+            cls._folders_dirty = False
+        except OSError as e:
+            logger.warning("Не удалось сохранить кеш папок Я.Диска: %s", e)
     
     def get_order_folder(self, order: Order) -> str:
         """Возвращает путь к папке заказа на Яндекс.Диске."""
         # Структура: /Photo28_Orders/YYYY-MM/order_number/
-        date_folder = order.created_at.strftime("%Y-%m")
-        return f"{self.BASE_FOLDER}/{date_folder}/{order.order_number}"
+        created_at = order.created_at
+        return _order_folder(
+            self.BASE_FOLDER, order.order_number, created_at.year, created_at.month
+        )
     
     async def upload_order_photos(
         self,
@@ -69,29 +275,119 @@ class YandexDiskService:
         if not self.token:
             raise ValueError("Яндекс.Диск токен не настроен")
         
-        # Создаём структуру папок
-        await self.ensure_folder(self.BASE_FOLDER)
-        date_folder = order.created_at.strftime("%Y-%m")
-        await self.ensure_folder(f"{self.BASE_FOLDER}/{date_folder}")
-        
+        # Создаём структуру папок: BASE_FOLDER/YYYY-MM/order_number
         order_folder = self.get_order_folder(order)
         await self.ensure_folder(order_folder)
         
-        # Загружаем файлы
+        # Один проход scandir: тип файла приходит вместе с записью каталога,
+        # без отдельного stat для проверки типа и без Path на каждую запись
+        with os.scandir(local_photos_dir) as it:
+            entries = [
+                (entry.path, entry.name, entry.stat(follow_symlinks=False))
+                for entry in it
+                if entry.is_file(follow_symlinks=False) and "." in entry.name
+            ]
+        
+        # Крупные файлы вперёд: они идут параллельно с мелкими,
+        # а не остаются одиноким хвостом в конце пачки
+        entries.sort(key=lambda e: e[2].st_size, reverse=True)
+        
+        remote = await self._remote_files(order_folder)
+        workers = max(1, settings.yandex_upload_concurrency)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=64)
         uploaded_paths = []
         
-        for file_path in local_photos_dir.glob("*.*"):
-            if file_path.is_file():
-                remote_path = f"{order_folder}/{file_path.name}"
-                
+        async def produce() -> None:
+            # Сверка с Диском (MD5 в потоке) идёт, пока воркеры уже грузят
+            try:
+                for file_path, name, stat in entries:
+                    remote_path = f"{order_folder}/{name}"
+                    if await self._is_uploaded(file_path, stat.st_size, remote.get(name)):
+                        # Уже лежит на Диске с тем же содержимым
+                        uploaded_paths.append(remote_path)
+                    else:
+                        # Пока файл ждёт в очереди, ядро читает его с диска —
+                        # воркер начнёт отправку уже из page cache
+                        _prefetch(file_path)
+                        await queue.put((file_path, remote_path, stat.st_size))
+            finally:
+                for _ in range(workers):
+                    await queue.put(None)
+        
+        async def consume() -> None:
+            # Не больше N загрузок одновременно — по числу воркеров
+            while (item := await queue.get()) is not None:
+                file_path, remote_path, size = item
+                options = {"overwrite": True}
+                if size > self.LARGE_UPLOAD_BYTES:
+                    options["timeout"] = self.LARGE_UPLOAD_TIMEOUT
                 try:
-                    await self.client.upload(str(file_path), remote_path, overwrite=True)
+                    try:
+                        await self._upload_with_retry(file_path, remote_path, **options)
+                    except yadisk_async.exceptions.ParentNotFoundError:
+                        # Папку удалили на Диске, а кеш всё ещё считает её
+                        # существующей: забываем, создаём заново, пробуем ещё раз
+                        self._forget_folder(order_folder)
+                        await self.ensure_folder(order_folder)
+                        await self._upload_with_retry(file_path, remote_path, **options)
+                except Exception:
+                    logger.exception("Ошибка загрузки %s", file_path)
+                else:
                     uploaded_paths.append(remote_path)
-                except Exception as e:
-                    print(f"Ошибка загрузки {file_path}: {e}")
+        
+        await asyncio.gather(produce(), *(consume() for _ in range(workers)))
         
         return uploaded_paths
     
+    async def _remote_files(self, folder: str) -> dict[str, tuple[int, str]]:
+        """Файлы папки на Диске одним запросом: {name: (size, md5)}."""
+        try:
+            return {
+                item.name: (item.size, item.md5)
+                async for item in await self.client.listdir(
+                    folder, fields=["name", "type", "size", "md5"]
+                )
+                if item.type == "file"
+            }
+        except Exception:
+            # Нет папки или листинг не удался — просто грузим всё
+            return {}
+    
+    async def _is_uploaded(
+        self,
+        path: str,
+        size: int,
+        remote: Optional[tuple[int, str]],
+    ) -> bool:
+        """Совпадает ли локальный файл с уже загруженным (размер, затем MD5).
+
+        MD5 считается только при совпавшем размере; между вызовами он не
+        запоминается — каждый файл за прогон хешируется не больше раза.
+        """
+        if remote is None or remote[0] != size or not remote[1]:
+            return False
+        try:
+            local_md5 = await asyncio.to_thread(_file_md5, path)
+        except OSError:
+            # Не прочитали — пусть загрузка сама сообщит об ошибке
+            return False
+        return local_md5 == remote[1]
+    
+    async def _upload_with_retry(self, file_path: str, remote_path: str, **options) -> None:
+        """Загружает файл, повторяя при временных ошибках с растущей паузой.
+
+        Собственные повторы yadisk (без паузы) отключены через n_retries=0,
+        чтобы попытки не перемножались.
+        """
+        for attempt in range(self.UPLOAD_ATTEMPTS):
+            try:
+                await self.client.upload(file_path, remote_path, n_retries=0, **options)
+                return
+            except _RETRIABLE:
+                if attempt == self.UPLOAD_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(self.UPLOAD_RETRY_DELAY * 2 ** attempt)
+    
     async def get_order_public_link(self, order: Order) -> Optional[str]:
         """
         Получает публичную ссылку на папку заказа.
@@ -100,41 +396,89 @@ class YandexDiskService:
             Публичная ссылка или None
         """
         order_folder = self.get_order_folder(order)
+        cache = self._public_url_cache
+        now = time.monotonic()
+        cached = cache.get(order_folder)
+        if cached and now < cached[0]:
+            cache.move_to_end(order_folder)
+            return cached[1]
         
         try:
             # Публикуем папку
             await self.client.publish(order_folder)
             
-            # Получаем публичную ссылку
-            meta = await self.client.get_meta(order_folder)
+            # Получаем только публичную ссылку, без остальной меты
+            meta = await self.client.get_meta(order_folder, fields=["public_url"])
+            if meta.public_url:
+                cache[order_folder] = (now + self.PUBLIC_URL_TTL, meta.public_url)
+                cache.move_to_end(order_folder)
+                while len(cache) > self.PUBLIC_URL_CACHE_SIZE:
+                    cache.popitem(last=False)
             return meta.public_url
-        except Exception as e:
-            print(f"Ошибка получения публичной ссылки: {e}")
+        except Exception:
+            logger.exception("Ошибка получения публичной ссылки %s", order_folder)
             return None
     
-    async def list_orders(self) -> list[dict]:
-        """Возвращает список заказов на Яндекс.Диске."""
-        orders = []
-        
+    async def list_orders(self) -> AsyncIterator[dict]:
+        """Отдаёт заказы на Яндекс.Диске по мере листинга папок-месяцев.
+
+        Месяцы листаются параллельно, заказы приходят из того месяца, что
+        ответил первым; можно прервать `async for`, не дожидаясь остальных.
+        """
         try:
-            async for item in await self.client.listdir(self.BASE_FOLDER):
-                if item.type == "dir":
-                    # Это папка с месяцем
-                    month_path = f"{self.BASE_FOLDER}/{item.name}"
-                    async for order_item in await self.client.listdir(month_path):
-                        if order_item.type == "dir":
-                            orders.append({
-                                "order_number": order_item.name,
-                                "path": f"{month_path}/{order_item.name}",
-                                "created": order_item.created,
-                            })
-        except Exception as e:
-            print(f"Ошибка получения списка заказов: {e}")
+            # Сначала папки-месяцы, затем их содержимое — параллельно
+            months = [
+                item.name
+                async for item in await self.client.listdir(self.BASE_FOLDER)
+                if item.type == "dir"
+            ]
+        except Exception:
+            logger.exception("Ошибка получения списка заказов")
+            return
         
-        return orders
+        semaphore = asyncio.Semaphore(self.LIST_CONCURRENCY)
+        tasks = {
+            asyncio.ensure_future(self._list_month(month, semaphore)): month
+            for month in months
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        logger.error(
+                            "Ошибка получения списка заказов за %s",
+                            tasks[task],
+                            exc_info=task.exception(),
+                        )
+                        continue
+                    for order in task.result():
+                        yield order
+        finally:
+            # Вызывающий вышел из цикла раньше — недолистанные месяцы не нужны
+            for task in pending:
+                task.cancel()
+    
+    async def _list_month(self, month: str, semaphore: asyncio.Semaphore) -> list[dict]:
+        """Возвращает заказы из одной папки-месяца."""
+        month_path = f"{self.BASE_FOLDER}/{month}"
+        async with semaphore:
+            return [
+                {
+                    "order_number": item.name,
+                    "path": f"{month_path}/{item.name}",
+                    "created": item.created,
+                }
+                async for item in await self.client.listdir(month_path)
+                if item.type == "dir"
+            ]
     
     async def close(self) -> None:
-        """Закрывает соединение."""
+        """Закрывает соединение и сохраняет кеш папок."""
+        self._save_known_folders()
         if self._client:
             await self._client.close()
             self._client = None
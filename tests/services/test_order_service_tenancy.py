@@ -41,3 +41,42 @@ async def test_orders_isolated_between_studios(db_session):
     assert await svc2.get_order_by_id(order1.id) is None
     assert len(await svc2.get_all_orders()) == 0
     assert len(await svc1.get_all_orders()) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_create_user_upserts_profile(db_session):
+    s1, _ = await _two_studios(db_session)
+    svc = OrderService(db_session, studio_id=s1.id)
+
+    created = await svc.get_or_create_user(telegram_id=5, username="old", first_name="A")
+    updated = await svc.get_or_create_user(telegram_id=5, username="new", first_name="B")
+    assert updated.id == created.id
+    assert updated.username == "new"
+    assert updated.first_name == "B"
+
+
+@pytest.mark.asyncio
+async def test_apply_promocode_increments_uses_atomically(db_session):
+    from sqlalchemy import select
+    from src.models.promocode import Promocode
+
+    s1, _ = await _two_studios(db_session)
+    svc = OrderService(db_session, studio_id=s1.id)
+    user = await svc.get_or_create_user(telegram_id=1)
+    order = await svc.create_order(user)
+    order.photos_cost = 1000
+    promo = await svc.create_promocode("SALE", discount_percent=10)
+
+    # Устаревшая копия счётчика в памяти не должна затирать значение в БД
+    await db_session.execute(
+        Promocode.__table__.update().values(current_uses=5)
+    )
+    await svc.apply_promocode(order, promo)
+
+    assert order.discount == 100
+    assert order.promocode_id == promo.id
+    assert promo.current_uses == 6
+    uses = (await db_session.execute(
+        select(Promocode.current_uses).where(Promocode.id == promo.id)
+    )).scalar_one()
+    assert uses == 6
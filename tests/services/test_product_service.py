@@ -3,7 +3,7 @@ import pytest
 
 from src.models.studio import Studio
 from src.models.product import Product
-from src.services.product_service import ProductService
+from src.services.product_service import ProductService, ProductView
 
 
 async def _two_studios_with_products(db_session):
@@ -111,3 +111,110 @@ async def test_update_delete_toggle_own_studio_works(db_session):
     assert ok is True
     gone = await svc.get_product_by_id(prod_a.id)
     assert gone is None
+
+
+@pytest.mark.asyncio
+async def test_active_children_sorted_and_filtered(db_session):
+    ProductService.invalidate_cache()
+    s1, _ = await _two_studios_with_products(db_session)
+    parent = Product(studio_id=s1.id, slug="cat", name="Cat", short_name="Cat")
+    db_session.add(parent)
+    await db_session.commit()
+    db_session.add_all([
+        Product(studio_id=s1.id, parent_id=parent.id, slug="v2", name="V2",
+                short_name="V2", sort_order=2),
+        Product(studio_id=s1.id, parent_id=parent.id, slug="v1", name="V1",
+                short_name="V1", sort_order=1),
+        Product(studio_id=s1.id, parent_id=parent.id, slug="off", name="Off",
+                short_name="Off", sort_order=0, is_active=False),
+    ])
+    await db_session.commit()
+    await ProductService(db_session).load_cache(s1.id)
+
+    children = ProductService.get_active_children(s1.id, parent.id)
+    assert [c.slug for c in children] == ["v1", "v2"]
+    assert ProductService.get_active_children(s1.id, 999999) == ()
+
+
+@pytest.mark.asyncio
+async def test_crud_patches_warm_cache_in_place(db_session):
+    ProductService.invalidate_cache()
+    s1, _ = await _two_studios_with_products(db_session)
+    svc = ProductService(db_session)
+    await svc.load_cache(s1.id)
+    # Каждый запрос админки работает в своей сессии — кеш держит отсоединённые объекты
+    db_session.expunge_all()
+
+    cat = await svc.create_product(s1.id, slug="cat", name="Cat", short_name="Cat",
+                                   sort_order=5)
+    var = await svc.create_product(s1.id, slug="v", name="V", short_name="V",
+                                   parent_id=cat.id)
+    db_session.expunge_all()
+    assert [p.slug for p in ProductService.get_top_level_products(s1.id)] == ["a", "cat"]
+    assert [p.slug for p in ProductService.get_all_purchasable(s1.id)] == ["a", "v"]
+
+    await svc.toggle_product(var.id, studio_id=s1.id)
+    db_session.expunge_all()
+    assert ProductService.get_active_children(s1.id, cat.id) == ()
+    assert [p.slug for p in ProductService.get_all_purchasable(s1.id)] == ["a", "cat"]
+
+    await svc.update_product(cat.id, studio_id=s1.id, sort_order=-1)
+    db_session.expunge_all()
+    assert [p.slug for p in ProductService.get_top_level_products(s1.id)] == ["cat", "a"]
+
+    await svc.delete_product(cat.id, studio_id=s1.id)
+    assert ProductService.get_product(s1.id, cat.id) is None
+    assert ProductService.get_product(s1.id, var.id) is None
+    assert [p.slug for p in ProductService.get_top_level_products(s1.id)] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_cache_holds_detached_views(db_session):
+    ProductService.invalidate_cache()
+    s1, _ = await _two_studios_with_products(db_session)
+    tiered = Product(studio_id=s1.id, slug="t", name="T", short_name="T",
+                     price_type="tiered", price_per_unit=30,
+                     price_tiers='[{"min_qty": 10, "price": 20}]')
+    db_session.add(tiered)
+    await db_session.commit()
+
+    await ProductService(db_session).load_cache(s1.id)
+    view = ProductService.get_product(s1.id, tiered.id)
+    assert isinstance(view, ProductView)
+    assert view.get_price_tiers() == [{"min_qty": 10, "price": 20}]
+    assert view.display_price == "от 30₽/шт"
+    with pytest.raises(AttributeError):
+        view.name = "X"
+
+
+@pytest.mark.asyncio
+async def test_get_all_products_links_parents_without_extra_query(db_session):
+    s1, _ = await _two_studios_with_products(db_session)
+    parent = Product(studio_id=s1.id, slug="cat", name="Cat", short_name="Cat")
+    db_session.add(parent)
+    await db_session.commit()
+    child = Product(studio_id=s1.id, parent_id=parent.id, slug="v", name="V", short_name="V")
+    db_session.add(child)
+    await db_session.commit()
+    db_session.expunge_all()
+
+    by_id = {p.id: p for p in await ProductService(db_session).get_all_products(s1.id)}
+    assert by_id[child.id].parent is by_id[parent.id]
+    assert by_id[parent.id].parent is None
+
+
+@pytest.mark.asyncio
+async def test_writes_swap_catalog_snapshot(db_session):
+    ProductService.invalidate_cache()
+    s1, _ = await _two_studios_with_products(db_session)
+    svc = ProductService(db_session)
+    assert ProductService.get_catalog_version(s1.id) == 0
+    await svc.load_cache(s1.id)
+    assert ProductService.get_catalog_version(s1.id) == 1
+    before = ProductService.get_top_level_products(s1.id)
+
+    await svc.create_product(s1.id, slug="new", name="New", short_name="New")
+    assert ProductService.get_catalog_version(s1.id) == 2
+    # Ранее выданный снимок не меняется под читателем
+    assert [p.slug for p in before] == ["a"]
+    assert [p.slug for p in ProductService.get_top_level_products(s1.id)] == ["a", "new"]
@@ -41,3 +41,116 @@ async def test_set_value_updates_only_one_studio(db_session):
     await svc.set_value(s1.id, "min_photos", "99")
     assert SettingsService.get_int(s1.id, "min_photos", 0) == 99
     assert SettingsService.get_int(s2.id, "min_photos", 0) == 3
+
+
+@pytest.mark.asyncio
+async def test_typed_getters_use_precomputed_values(db_session):
+    SettingsService.invalidate_cache()
+    s1, _ = await _two_studios(db_session)
+    db_session.add_all([
+        Setting(studio_id=s1.id, key="chat", value="-100500", value_type=SettingType.STRING),
+        Setting(studio_id=s1.id, key="name", value="Студия", value_type=SettingType.STRING),
+        Setting(studio_id=s1.id, key="flag", value="да", value_type=SettingType.STRING),
+    ])
+    await db_session.commit()
+    svc = SettingsService(db_session)
+    await svc.load_cache(s1.id)
+
+    assert SettingsService.get_int(s1.id, "chat", 0) == -100500
+    assert SettingsService.get_int(s1.id, "name", 7) == 7
+    assert SettingsService.get_float(s1.id, "min_photos", 0.0) == 10.0
+    assert SettingsService.get_bool(s1.id, "flag", False) is True
+    assert SettingsService.get_bool(s1.id, "missing", True) is True
+
+    from src.services import settings_service
+    before = settings_service._settings[s1.id]
+    await svc.set_value(s1.id, "name", "12")
+    assert SettingsService.get_int(s1.id, "name", 7) == 12
+    # Запись подменяет снимок, а не правит опубликованный
+    assert "name" not in before.ints
+
+
+def test_default_settings_keys_are_unique():
+    from src.services.settings_service import (
+        DEFAULT_SETTINGS, DEFAULT_SETTINGS_BY_KEY, SettingKeys,
+    )
+
+    assert len(DEFAULT_SETTINGS_BY_KEY) == len(DEFAULT_SETTINGS)
+    assert SettingKeys.get_default(SettingKeys.MIN_PHOTOS).value == "10"
+    assert SettingKeys.get_default("no_such_key") is None
+
+
+@pytest.mark.asyncio
+async def test_set_value_unknown_key_raises(db_session):
+    SettingsService.invalidate_cache()
+    s1, _ = await _two_studios(db_session)
+    svc = SettingsService(db_session)
+
+    with pytest.raises(ValueError):
+        await svc.set_value(s1.id, "no_such_key", "1")
+
+    setting = await svc.set_value(s1.id, "min_photos", 15)
+    assert setting.value == "15"
+    assert (await svc.get_by_key(s1.id, "min_photos")).value == "15"
+
+
+@pytest.mark.asyncio
+async def test_seed_defaults_inserts_only_missing(db_session):
+    from sqlalchemy import func, select
+    from src.services.settings_service import DEFAULT_SETTINGS
+
+    SettingsService.invalidate_cache()
+    s1, s2 = await _two_studios(db_session)  # min_photos уже есть
+    svc = SettingsService(db_session)
+
+    added = await svc.seed_defaults(s1.id)
+    assert added == len(DEFAULT_SETTINGS) - 1
+    assert await svc.seed_defaults(s1.id) == 0
+
+    count = (await db_session.execute(
+        select(func.count(Setting.id)).where(Setting.studio_id == s1.id)
+    )).scalar_one()
+    assert count == len(DEFAULT_SETTINGS)
+    assert (await svc.get_by_key(s1.id, "min_photos")).value == "10"
+
+    # Конфликт по ключу не перетирает значение студии
+    await svc.seed_defaults(s2.id)
+    assert (await svc.get_by_key(s2.id, "min_photos")).value == "3"
+
+
+@pytest.mark.asyncio
+async def test_persisted_snapshot_restores_cache(db_session, tmp_path, monkeypatch):
+    from src.services import settings_service
+
+    monkeypatch.setattr(settings_service.app_settings, "cache_snapshot_dir", tmp_path)
+    monkeypatch.setattr(settings_service.app_settings, "cache_snapshot_ttl", 60)
+    SettingsService.invalidate_cache()
+    s1, _ = await _two_studios(db_session)
+    await SettingsService(db_session).load_cache(s1.id)
+    assert not list(tmp_path.iterdir())  # админский load_cache файл не пишет
+    await SettingsService(db_session).load_cache(s1.id, persist=True)
+
+    settings_service._settings.clear()  # как после перезапуска процесса
+    assert SettingsService.load_persisted_cache(s1.id) is True
+    assert SettingsService.get_int(s1.id, "min_photos") == 10
+
+    SettingsService.invalidate_cache(s1.id)
+    assert SettingsService.load_persisted_cache(s1.id) is False
+
+
+@pytest.mark.asyncio
+async def test_partial_cache_is_not_persisted(db_session, tmp_path, monkeypatch):
+    from src.services import settings_service
+
+    monkeypatch.setattr(settings_service.app_settings, "cache_snapshot_dir", tmp_path)
+    monkeypatch.setattr(settings_service.app_settings, "cache_snapshot_ttl", 60)
+    SettingsService.invalidate_cache()
+    s1, _ = await _two_studios(db_session)
+    await SettingsService(db_session).load_cache(s1.id, persist=True)
+
+    # Свежий процесс админки: кеш студии не загружен, пишется один ключ
+    settings_service._settings.clear()
+    await SettingsService(db_session).set_value(s1.id, "min_photos", 5)
+
+    settings_service._settings.clear()
+    assert SettingsService.load_persisted_cache(s1.id) is False
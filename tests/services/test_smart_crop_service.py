@@ -0,0 +1,73 @@
+"""Тесты умного кропа."""
+import pytest
+
+from src.services.smart_crop_service import SmartCropService, get_smart_crop_service
+
+
+def test_service_per_priority_shares_detector():
+    a = get_smart_crop_service(80)
+    b = get_smart_crop_service(30)
+    assert a is get_smart_crop_service(80)
+    assert a is not b
+    assert (a.face_priority, b.face_priority) == (0.8, 0.3)
+    if SmartCropService.is_available():
+        assert a._get_face_detector() is b._get_face_detector()
+
+
+async def test_analyze_photo_async_matches_sync():
+    if not SmartCropService.is_available():
+        pytest.skip("OpenCV не установлен")
+    import asyncio
+    import cv2
+    import numpy as np
+
+    service = SmartCropService()
+    photos = []
+    for w, h in [(800, 600), (600, 800), (1000, 1000), (700, 300), (640, 480)]:
+        _, buf = cv2.imencode(".jpg", np.full((h, w, 3), 90, np.uint8))
+        photos.append(buf.tobytes())
+
+    results = await asyncio.gather(*(service.analyze_photo_async(p) for p in photos))
+    assert results == [service.analyze_photo(p) for p in photos]
+
+
+def test_crop_around_faces_counts_faces_inside():
+    if not SmartCropService.is_available():
+        pytest.skip("OpenCV не установлен")
+    import numpy as np
+
+    service = SmartCropService()
+    faces = np.array([[100, 100, 50, 50], [900, 100, 40, 40], [400, 700, 60, 60]],
+                     dtype=np.int32)
+    assert service._count_faces_in_crop(faces, 0, 0, 500, 800) == 2
+    crop = service._crop_around_faces(1000, 800, faces, 608, 800)
+    assert (crop.width, crop.height, crop.faces_found) == (608, 800, 3)
+    assert 0 <= crop.x <= 1000 - crop.width
+
+
+def test_peek_image_size_reads_headers():
+    import io
+    from PIL import Image
+
+    from src.services.smart_crop_service import _peek_image_size
+
+    for fmt in ("JPEG", "PNG"):
+        buf = io.BytesIO()
+        Image.new("RGB", (321, 123)).save(buf, fmt)
+        assert _peek_image_size(buf.getvalue()) == (321, 123)
+    assert _peek_image_size(b"not an image") is None
+
+
+def test_matching_aspect_ratio_skips_detection(monkeypatch):
+    if not SmartCropService.is_available():
+        pytest.skip("OpenCV не установлен")
+    import cv2
+    import numpy as np
+
+    service = SmartCropService()
+    monkeypatch.setattr(service, "_detect_faces", lambda img: pytest.fail("детекция не нужна"))
+    _, buf = cv2.imencode(".jpg", np.zeros((1000, 760, 3), np.uint8))
+
+    result = service.analyze_photo(buf.tobytes(), aspect_ratio=0.76)
+    assert (result.x, result.y, result.width, result.height) == (0, 0, 760, 1000)
+    assert (result.method, result.confidence) == ("identity", 1.0)
@@ -0,0 +1,423 @@
+"""Тесты сервиса Яндекс.Диска на фейковом клиенте."""
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from src.services.yandex_disk import YandexDiskService
+
+
+class FakeYaDisk:
+    """Фейк yadisk_async.YaDisk: пишет вызовы и считает параллельные загрузки."""
+
+    def __init__(self, fail_names=()):
+        self.calls = []
+        self.fail_names = set(fail_names)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.remote_items = []
+
+    async def check_token(self):
+        self.calls.append(("check_token",))
+        return True
+
+    async def exists(self, path):
+        self.calls.append(("exists", path))
+        return False
+
+    async def mkdir(self, path):
+        self.calls.append(("mkdir", path))
+
+    async def upload(self, src, remote_path, overwrite=False, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if remote_path.rsplit("/", 1)[-1] in self.fail_names:
+                raise RuntimeError("upload failed")
+            self.calls.append(("upload", remote_path))
+        finally:
+            self.in_flight -= 1
+
+    async def listdir(self, path, **kwargs):
+        async def items():
+            for item in self.remote_items:
+                yield item
+        return items()
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _fresh_folder_cache():
+    YandexDiskService._known_folders.clear()
+    YandexDiskService.invalidate_token_cache()
+    YandexDiskService._public_url_cache.clear()
+    YandexDiskService._folders_loaded = False
+    YandexDiskService._folders_dirty = False
+
+
+def _service(fake):
+    svc = YandexDiskService()
+    svc.token = "token"
+    svc._client = fake
+    return svc
+
+
+def _order():
+    return SimpleNamespace(order_number="PH-1", created_at=datetime(2024, 5, 3))
+
+
+@pytest.mark.asyncio
+async def test_upload_runs_concurrently_under_limit(tmp_path, monkeypatch):
+    from src.services import yandex_disk
+
+    monkeypatch.setattr(yandex_disk.settings, "yandex_upload_concurrency", 3)
+    for i in range(7):
+        (tmp_path / f"{i}.jpg").write_bytes(b"x")
+    (tmp_path / "sub.d").mkdir()
+    (tmp_path / "README").write_bytes(b"x")
+    (tmp_path / "link.jpg").symlink_to(tmp_path / "0.jpg")
+    fake = FakeYaDisk(fail_names={"4.jpg"})
+
+    uploaded = await _service(fake).upload_order_photos(_order(), tmp_path)
+
+    assert sorted(uploaded) == sorted(
+        f"/Photo28_Orders/2024-05/PH-1/{i}.jpg" for i in range(7) if i != 4
+    )
+    assert 1 < fake.max_in_flight <= 3
+
+
+@pytest.mark.asyncio
+async def test_ensure_folder_skips_exists_and_remembers_folders():
+    import yadisk_async
+
+    class ExistingFolderYaDisk(FakeYaDisk):
+        async def mkdir(self, path):
+            await super().mkdir(path)
+            raise yadisk_async.exceptions.DirectoryExistsError()
+
+    fake = ExistingFolderYaDisk()
+    svc = _service(fake)
+
+    await svc.ensure_folder("/Photo28_Orders")
+    await svc.ensure_folder("/Photo28_Orders")
+    await _service(fake).ensure_folder("/Photo28_Orders")
+
+    assert fake.calls == [("mkdir", "/Photo28_Orders")]
+
+
+@pytest.mark.asyncio
+async def test_ensure_folder_creates_deepest_first():
+    import yadisk_async
+
+    class DiskWithFolders(FakeYaDisk):
+        def __init__(self, existing):
+            super().__init__()
+            self.existing = set(existing)
+
+        async def mkdir(self, path):
+            await super().mkdir(path)
+            if path in self.existing:
+                raise yadisk_async.exceptions.DirectoryExistsError()
+            if path.rsplit("/", 1)[0] not in self.existing | {""}:
+                raise yadisk_async.exceptions.ParentNotFoundError()
+            self.existing.add(path)
+
+    warm = DiskWithFolders({"/Photo28_Orders", "/Photo28_Orders/2024-05"})
+    await _service(warm).ensure_folder("/Photo28_Orders/2024-05/PH-1")
+    assert warm.calls == [("mkdir", "/Photo28_Orders/2024-05/PH-1")]
+
+    YandexDiskService._known_folders.clear()
+    cold = DiskWithFolders(set())
+    await _service(cold).ensure_folder("/Photo28_Orders/2024-05/PH-1")
+    assert "/Photo28_Orders/2024-05/PH-1" in cold.existing
+    assert YandexDiskService._known_folders == {
+        "/Photo28_Orders", "/Photo28_Orders/2024-05", "/Photo28_Orders/2024-05/PH-1",
+    }
+
+
+@pytest.mark.asyncio
+async def test_check_connection_is_cached_per_token():
+    fake = FakeYaDisk()
+    assert await _service(fake).check_connection() is True
+    assert await _service(fake).check_connection() is True
+    assert fake.calls == [("check_token",)]
+
+    YandexDiskService.invalidate_token_cache("token")
+    await _service(fake).check_connection()
+    assert len(fake.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_list_orders_fans_out_over_months():
+    tree = {
+        "/Photo28_Orders": ["2024-04", "2024-05", "notes.txt"],
+        "/Photo28_Orders/2024-04": ["PH-1"],
+        "/Photo28_Orders/2024-05": ["PH-2", "PH-3"],
+    }
+
+    class ListingYaDisk(FakeYaDisk):
+        async def listdir(self, path):
+            async def items():
+                for name in tree[path]:
+                    await asyncio.sleep(0)
+                    yield SimpleNamespace(
+                        name=name,
+                        type="file" if "." in name else "dir",
+                        created=None,
+                    )
+            return items()
+
+    orders = [o async for o in _service(ListingYaDisk()).list_orders()]
+
+    # Ранний выход: остальные месяцы не дожидаемся
+    stream = _service(ListingYaDisk()).list_orders()
+    first = await anext(stream)
+    await stream.aclose()
+    assert first["order_number"] in {"PH-1", "PH-2", "PH-3"}
+
+    assert sorted(o["path"] for o in orders) == [
+        "/Photo28_Orders/2024-04/PH-1",
+        "/Photo28_Orders/2024-05/PH-2",
+        "/Photo28_Orders/2024-05/PH-3",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_public_link_requests_only_url_and_is_cached(monkeypatch):
+    class PublishingYaDisk(FakeYaDisk):
+        async def publish(self, path):
+            self.calls.append(("publish", path))
+
+        async def get_meta(self, path, **kwargs):
+            self.calls.append(("get_meta", path, kwargs))
+            return SimpleNamespace(public_url="https://yadi.sk/d/abc")
+
+    fake = PublishingYaDisk()
+    folder = "/Photo28_Orders/2024-05/PH-1"
+
+    assert await _service(fake).get_order_public_link(_order()) == "https://yadi.sk/d/abc"
+    assert await _service(fake).get_order_public_link(_order()) == "https://yadi.sk/d/abc"
+    assert fake.calls == [
+        ("publish", folder),
+        ("get_meta", folder, {"fields": ["public_url"]}),
+    ]
+
+    # Кеш ограничен по размеру: старые папки вытесняются
+    monkeypatch.setattr(YandexDiskService, "PUBLIC_URL_CACHE_SIZE", 1)
+    other = SimpleNamespace(order_number="PH-2", created_at=datetime(2024, 5, 3))
+    await _service(fake).get_order_public_link(other)
+    assert list(YandexDiskService._public_url_cache) == ["/Photo28_Orders/2024-05/PH-2"]
+
+
+@pytest.mark.asyncio
+async def test_large_files_upload_first_with_long_timeout(tmp_path, monkeypatch):
+    from src.services import yandex_disk
+
+    monkeypatch.setattr(yandex_disk.settings, "yandex_upload_concurrency", 1)
+    monkeypatch.setattr(YandexDiskService, "LARGE_UPLOAD_BYTES", 100)
+    (tmp_path / "small.jpg").write_bytes(b"x" * 10)
+    (tmp_path / "raw.tif").write_bytes(b"x" * 1000)
+    timeouts = {}
+
+    class TimingYaDisk(FakeYaDisk):
+        async def upload(self, src, remote_path, overwrite=False, **kwargs):
+            timeouts[remote_path.rsplit("/", 1)[-1]] = kwargs.get("timeout")
+            await super().upload(src, remote_path, overwrite)
+
+    fake = TimingYaDisk()
+    await _service(fake).upload_order_photos(_order(), tmp_path)
+
+    assert [c[1].rsplit("/", 1)[-1] for c in fake.calls if c[0] == "upload"] == [
+        "raw.tif",
+        "small.jpg",
+    ]
+    assert timeouts == {
+        "raw.tif": YandexDiskService.LARGE_UPLOAD_TIMEOUT,
+        "small.jpg": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_upload_retries_transient_errors(tmp_path, monkeypatch):
+    import aiohttp
+
+    monkeypatch.setattr(YandexDiskService, "UPLOAD_RETRY_DELAY", 0)
+    (tmp_path / "a.jpg").write_bytes(b"x")
+    (tmp_path / "b.jpg").write_bytes(b"x")
+    attempts = {"a.jpg": 0, "b.jpg": 0}
+
+    class FlakyYaDisk(FakeYaDisk):
+        async def upload(self, src, remote_path, overwrite=False, **kwargs):
+            name = remote_path.rsplit("/", 1)[-1]
+            attempts[name] += 1
+            assert kwargs["n_retries"] == 0
+            if name == "a.jpg" and attempts[name] < 3:
+                raise aiohttp.ClientConnectionError()
+            if name == "b.jpg":
+                raise ValueError("not retriable")
+
+    uploaded = await _service(FlakyYaDisk()).upload_order_photos(_order(), tmp_path)
+
+    assert uploaded == ["/Photo28_Orders/2024-05/PH-1/a.jpg"]
+    assert attempts == {"a.jpg": 3, "b.jpg": 1}
+
+
+@pytest.mark.asyncio
+async def test_upload_skips_files_already_on_disk(tmp_path, monkeypatch):
+    import hashlib
+
+    from src.services import yandex_disk
+
+    (tmp_path / "same.jpg").write_bytes(b"same")
+    (tmp_path / "changed.jpg").write_bytes(b"new!")
+    (tmp_path / "new.jpg").write_bytes(b"new")
+    fake = FakeYaDisk()
+    fake.remote_items = [
+        SimpleNamespace(name="same.jpg", type="file", size=4,
+                        md5=hashlib.md5(b"same").hexdigest()),
+        SimpleNamespace(name="changed.jpg", type="file", size=4,
+                        md5=hashlib.md5(b"old!").hexdigest()),
+    ]
+
+    prefetched = []
+    monkeypatch.setattr(yandex_disk, "_prefetch", prefetched.append)
+
+    uploaded = await _service(fake).upload_order_photos(_order(), tmp_path)
+
+    folder = "/Photo28_Orders/2024-05/PH-1"
+    assert sorted(prefetched) == [str(tmp_path / "changed.jpg"), str(tmp_path / "new.jpg")]
+    assert sorted(uploaded) == [f"{folder}/{n}" for n in ("changed.jpg", "new.jpg", "same.jpg")]
+    assert sorted(c[1] for c in fake.calls if c[0] == "upload") == [
+        f"{folder}/changed.jpg",
+        f"{folder}/new.jpg",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_known_folders_survive_restart(tmp_path, monkeypatch):
+    from src.services import yandex_disk
+
+    monkeypatch.setattr(yandex_disk.settings, "cache_snapshot_dir", tmp_path)
+    monkeypatch.setattr(yandex_disk.settings, "yandex_folder_cache_ttl", 3600)
+    svc = _service(FakeYaDisk())
+    await svc.ensure_folder("/Photo28_Orders/2024-05/PH-1")
+    await svc.close()
+
+    # «Перезапуск»: память процесса пуста, кеш поднимается из файла
+    YandexDiskService._known_folders.clear()
+    YandexDiskService._folders_loaded = False
+    fake = FakeYaDisk()
+    await _service(fake).ensure_folder("/Photo28_Orders/2024-05/PH-1")
+    assert fake.calls == []
+
+    # Просроченный файл игнорируется
+    YandexDiskService._known_folders.clear()
+    YandexDiskService._folders_loaded = False
+    monkeypatch.setattr(yandex_disk.time, "time", lambda: 10**12)
+    _service(FakeYaDisk())
+    assert YandexDiskService._known_folders == set()
+
+
+@pytest.mark.asyncio
+async def test_upload_recreates_folder_deleted_on_disk(tmp_path):
+    import yadisk_async
+
+    class VanishingFolderYaDisk(FakeYaDisk):
+        """Диск, на котором папку заказа удалили руками: mkdir заново её создаёт."""
+
+        def __init__(self):
+            super().__init__()
+            self.existing = set()
+
+        async def mkdir(self, path):
+            await super().mkdir(path)
+            parent = path.rsplit("/", 1)[0]
+            if parent and parent not in self.existing:
+                raise yadisk_async.exceptions.ParentNotFoundError()
+            self.existing.add(path)
+
+        async def upload(self, src, remote_path, overwrite=False, **kwargs):
+            if remote_path.rsplit("/", 1)[0] not in self.existing:
+                raise yadisk_async.exceptions.ParentNotFoundError()
+            await super().upload(src, remote_path, overwrite)
+
+    (tmp_path / "a.jpg").write_bytes(b"x")
+    # Кеш помнит всю цепочку, а на Диске её уже нет
+    YandexDiskService._known_folders.update(
+        {"/Photo28_Orders", "/Photo28_Orders/2024-05", "/Photo28_Orders/2024-05/PH-1"}
+    )
+    fake = VanishingFolderYaDisk()
+
+    uploaded = await _service(fake).upload_order_photos(_order(), tmp_path)
+
+    assert uploaded == ["/Photo28_Orders/2024-05/PH-1/a.jpg"]
+    assert "/Photo28_Orders/2024-05/PH-1" in fake.existing
+    assert "/Photo28_Orders/2024-05/PH-1" in YandexDiskService._known_folders
+
+
+@pytest.mark.asyncio
+async def test_persisted_folder_deleted_on_disk_is_recreated(tmp_path, monkeypatch):
+    import yadisk_async
+
+    from src.services import yandex_disk
+
+    cache_dir = tmp_path / "cache"
+    photos = tmp_path / "photos"
+    photos.mkdir()
+    (photos / "a.jpg").write_bytes(b"x")
+    monkeypatch.setattr(yandex_disk.settings, "cache_snapshot_dir", cache_dir)
+    monkeypatch.setattr(yandex_disk.settings, "yandex_folder_cache_ttl", 3600)
+    svc = _service(FakeYaDisk())
+    await svc.ensure_folder("/Photo28_Orders/2024-05/PH-1")
+    await svc.close()
+
+    # «Перезапуск»: кеш поднят из файла, а папку заказа на Диске уже удалили
+    YandexDiskService._known_folders.clear()
+    YandexDiskService._folders_loaded = False
+    deleted = "/Photo28_Orders/2024-05/PH-1"
+
+    class DeletedFolderYaDisk(FakeYaDisk):
+        async def mkdir(self, path):
+            await super().mkdir(path)
+            if path != deleted:
+                raise yadisk_async.exceptions.PathExistsError()
+
+        async def upload(self, src, remote_path, overwrite=False, **kwargs):
+            if ("mkdir", deleted) not in self.calls:
+                raise yadisk_async.exceptions.ParentNotFoundError()
+            await super().upload(src, remote_path, overwrite)
+
+    fake = DeletedFolderYaDisk()
+    svc = _service(fake)
+    uploaded = await svc.upload_order_photos(_order(), photos)
+    await svc.close()
+
+    assert uploaded == [f"{deleted}/a.jpg"]
+    assert ("mkdir", deleted) in fake.calls
+    # Файл кеша переписан и снова содержит пересозданную папку
+    YandexDiskService._known_folders.clear()
+    YandexDiskService._folders_loaded = False
+    _service(FakeYaDisk())
+    assert deleted in YandexDiskService._known_folders
+
+
+@pytest.mark.asyncio
+async def test_ensure_folder_propagates_unrecoverable_errors(tmp_path):
+    import yadisk_async
+
+    class ForbiddenYaDisk(FakeYaDisk):
+        async def mkdir(self, path):
+            await super().mkdir(path)
+            raise yadisk_async.exceptions.ForbiddenError()
+
+    (tmp_path / "a.jpg").write_bytes(b"x")
+    fake = ForbiddenYaDisk()
+
+    with pytest.raises(yadisk_async.exceptions.ForbiddenError):
+        await _service(fake).upload_order_photos(_order(), tmp_path)
+    assert not any(c[0] == "upload" for c in fake.calls)
+    assert YandexDiskService._known_folders == set()